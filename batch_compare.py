@@ -0,0 +1,190 @@
+"""
+Headless batch comparison of pre/post Word documents.
+
+Compares every pair with the same pipeline as the Streamlit app and writes one report per pair
+plus an index.csv summary:
+
+    python batch_compare.py PRE_DIR POST_DIR -o reports/ --workers 32
+    python batch_compare.py --manifest pairs.csv -o reports/
+
+Directory mode pairs documents by file name (case-insensitive). A manifest is a CSV with
+`pre` and `post` columns (paths relative to the manifest) and an optional `name` column, which
+also names the report (repeated names get a -2, -3, ... suffix). Files without a partner are listed
+in index.csv with the column of the side they came from.
+With --format ndjson (or both) the change records are also written as one JSON object per line.
+"""
+import argparse
+import csv
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from comparison import load_document_model, report_filename, run_comparison, save_report
+
+UNSAFE_FILENAME_CHARS = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
+
+
+# === PAIRING ===
+def pairs_from_dirs(pre_dir, post_dir):
+    """Match .docx files by name; returns (pairs, unmatched_pre, unmatched_post)."""
+    def docx_files(folder):
+        found = {}
+        for name in os.listdir(folder):
+            if name.lower().endswith(".docx") and not name.startswith("~$"):  # skip Word lock files
+                found[name.lower()] = os.path.join(folder, name)
+        return found
+
+    pre, post = docx_files(pre_dir), docx_files(post_dir)
+    pairs = []
+    for key in sorted(pre.keys() & post.keys()):
+        name = os.path.basename(pre[key]).rsplit(".", 1)[0]
+        pairs.append((name, pre[key], post[key]))
+    unmatched_pre = sorted(pre[k] for k in pre.keys() - post.keys())
+    unmatched_post = sorted(post[k] for k in post.keys() - pre.keys())
+    return pairs, unmatched_pre, unmatched_post
+
+
+def pairs_from_manifest(manifest_path):
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    pairs = []
+    with open(manifest_path, newline="", encoding="utf-8-sig") as fh:
+        for row in csv.DictReader(fh):
+            pre = os.path.join(base, row["pre"].strip())
+            post = os.path.join(base, row["post"].strip())
+            name = (row.get("name") or "").strip() or os.path.basename(pre).rsplit(".", 1)[0]
+            pairs.append((name, pre, post))
+    return pairs
+
+
+def report_names(pairs):
+    """One report file name per pair, derived from the pair name and unique within the batch.
+
+    Names are compared case-insensitively (Windows/macOS folders); repeats get a -2, -3, ... suffix.
+    """
+    names, taken = [], set()
+    for name, pre, post in pairs:
+        pre_name = os.path.basename(pre).rsplit(".", 1)[0]
+        post_name = os.path.basename(post).rsplit(".", 1)[0]
+        stem = UNSAFE_FILENAME_CHARS.sub("_", name).strip(" .") or pre_name
+        if stem == pre_name:  # unnamed pair: keep the web app's file name
+            stem = report_filename(pre_name, post_name).rsplit(".", 1)[0]
+        else:
+            stem = f"Comparison_{stem}"
+        candidate, n = stem, 1
+        while candidate.lower() in taken:
+            n += 1
+            candidate = f"{stem}-{n}"
+        taken.add(candidate.lower())
+        names.append(candidate + ".docx")
+    return names
+
+
+# === WORKER ===
+def compare_pair(job):
+    """Compare one pair and save its report; runs in a worker process."""
+    name, pre_path, post_path, report, streaming, fmt, snapshot_pre = job
+    records = report.rsplit(".", 1)[0] + ".ndjson"
+    # records are streamed to a temp file that only replaces `records` once the pair succeeded,
+    # so a failed comparison never leaves a truncated .ndjson behind
+    partial = records + ".tmp"
+    started = time.perf_counter()
+    try:
+        doc1 = load_document_model(pre_path, streaming=streaming, snapshot=snapshot_pre)
+        doc2 = load_document_model(post_path, streaming=streaming)
+        if fmt == "ndjson":
+            # records are streamed to disk as they are found; nothing is kept for rendering
+            with open(partial, "w", encoding="utf-8") as fh:
+                run_comparison(doc1, doc2, ndjson=fh, keep=False)
+            os.replace(partial, records)
+            report = records
+        elif fmt == "both":
+            with open(partial, "w", encoding="utf-8") as fh:
+                save_report(run_comparison(doc1, doc2, ndjson=fh), report)
+            os.replace(partial, records)
+        else:
+            save_report(run_comparison(doc1, doc2), report)
+        status, error = "ok", ""
+    except Exception as exc:  # one bad document must not stop the batch
+        report, status, error = "", "error", f"{type(exc).__name__}: {exc}"
+        if os.path.exists(partial):
+            os.remove(partial)
+    return {
+        "name": name,
+        "pre": pre_path,
+        "post": post_path,
+        "report": report,
+        "status": status,
+        "seconds": round(time.perf_counter() - started, 2),
+        "error": error,
+    }
+
+
+def run_batch(pairs, out_dir, workers=None, streaming=False, progress=None, fmt="docx", snapshot_pre=False):
+    """Fan `pairs` out over a process pool; returns one result dict per pair, in input order."""
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = [
+        (name, pre, post, os.path.join(out_dir, report), streaming, fmt, snapshot_pre)
+        for (name, pre, post), report in zip(pairs, report_names(pairs))
+    ]
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(compare_pair, job): idx for idx, job in enumerate(jobs)}
+        for done, future in enumerate(as_completed(futures), start=1):
+            results[futures[future]] = future.result()
+            if progress:
+                progress(done, len(jobs), results[futures[future]])
+    return [results[idx] for idx in range(len(jobs))]
+
+
+def write_index(results, out_dir, unmatched_pre=(), unmatched_post=()):
+    path = os.path.join(out_dir, "index.csv")
+    fields = ["name", "pre", "post", "report", "status", "seconds", "error"]
+    with open(path, "w", newline="", encoding="utf-8") as fh:
+        writer = csv.DictWriter(fh, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(results)
+        for side, paths in (("pre", unmatched_pre), ("post", unmatched_post)):
+            for path_ in paths:
+                writer.writerow({"name": os.path.basename(path_), side: path_, "status": "unmatched"})
+    return path
+
+
+# === CLI ===
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare directories of pre/post .docx documents.")
+    parser.add_argument("pre_dir", nargs="?", help="folder with the PRE documents")
+    parser.add_argument("post_dir", nargs="?", help="folder with the POST documents")
+    parser.add_argument("--manifest", help="CSV with pre,post[,name] columns instead of two folders")
+    parser.add_argument("-o", "--out", required=True, help="folder for the reports and index.csv")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count(), help="worker processes (default: all cores)")
+    parser.add_argument("--streaming", action="store_true", help="low-memory reader (skips formatting checks)")
+    parser.add_argument("--snapshot-pre", action="store_true", help="reuse saved snapshots of PRE documents (see README)")
+    parser.add_argument("--format", choices=["docx", "ndjson", "both"], default="docx", help="report format (default: docx)")
+    args = parser.parse_args(argv)
+
+    unmatched_pre, unmatched_post = [], []
+    if args.manifest:
+        pairs = pairs_from_manifest(args.manifest)
+    elif args.pre_dir and args.post_dir:
+        pairs, unmatched_pre, unmatched_post = pairs_from_dirs(args.pre_dir, args.post_dir)
+    else:
+        parser.error("give PRE_DIR and POST_DIR, or --manifest")
+
+    def progress(done, total, result):
+        print(f"[{done}/{total}] {result['status']:5} {result['seconds']:>7.2f}s  {result['name']}", flush=True)
+
+    results = run_batch(
+        pairs, args.out, workers=args.workers, streaming=args.streaming, progress=progress, fmt=args.format,
+        snapshot_pre=args.snapshot_pre,
+    )
+    index = write_index(results, args.out, unmatched_pre, unmatched_post)
+
+    failed = sum(1 for r in results if r["status"] != "ok")
+    print(f"{len(results) - failed} compared, {failed} failed, {len(unmatched_pre) + len(unmatched_post)} unmatched -> {index}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
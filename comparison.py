@@ -1,228 +1,175 @@
-import streamlit as st
+import docx
 from docx import Document
-from docx.enum.text import WD_COLOR_INDEX, WD_ALIGN_PARAGRAPH
 from docx.shared import Pt
-from docx.enum.text import WD_COLOR_INDEX
 from docx.shared import RGBColor
 from docx.oxml.ns import qn
 from docx.oxml import OxmlElement
 import difflib, re
+import gzip
 from zipfile import ZipFile
 from lxml import etree
 from io import BytesIO
 from difflib import SequenceMatcher, get_close_matches
 import zipfile
-import xml.etree.ElementTree as ET
 import math
 from docx.text.paragraph import Paragraph
 from docx.oxml import parse_xml
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
 import hashlib
+import importlib
+import io
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import threading
+import time
 from docx.enum.text import WD_BREAK
+import json
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from collections import Counter, defaultdict, deque, namedtuple
 
 # === UTILS ===
-# Add a paragraph to the output document with a colored label and content
-def add_colored_paragraph(doc, label, content, color):
-    p = doc.add_paragraph()
-    run = p.add_run(f"{label} {content}")
-    run.font.color.rgb = RGBColor(*color)
-
-def get_alignment(para):
-    return {
-        WD_ALIGN_PARAGRAPH.LEFT: "LEFT",
-        WD_ALIGN_PARAGRAPH.CENTER: "CENTER",
-        WD_ALIGN_PARAGRAPH.RIGHT: "RIGHT",
-        WD_ALIGN_PARAGRAPH.JUSTIFY: "JUSTIFY",
-        None: "UNKNOWN"
-    }.get(para.alignment, "UNKNOWN")
-
-def get_indent(para):
-    l = para.paragraph_format.left_indent
-    r = para.paragraph_format.right_indent
-    return (round(l.cm, 2) if l else 0.0, round(r.cm, 2) if r else 0.0)
-
-def get_line_spacing(para):
-    return round(para.paragraph_format.line_spacing, 2) if para.paragraph_format.line_spacing else "Default"
-
-def get_highlight_name(color_enum):
-    highlight_map = {
-        WD_COLOR_INDEX.AUTO: "auto",
-        WD_COLOR_INDEX.BLACK: "black",
-        WD_COLOR_INDEX.BLUE: "blue",
-        WD_COLOR_INDEX.BRIGHT_GREEN: "bright green",
-        WD_COLOR_INDEX.DARK_BLUE: "dark blue",
-        WD_COLOR_INDEX.DARK_RED: "dark red",
-        WD_COLOR_INDEX.DARK_YELLOW: "dark yellow",
-        WD_COLOR_INDEX.GRAY_25: "gray 25%",
-        WD_COLOR_INDEX.GRAY_50: "gray 50%",
-        WD_COLOR_INDEX.GREEN: "green",
-        WD_COLOR_INDEX.PINK: "pink",
-        WD_COLOR_INDEX.RED: "red",
-        WD_COLOR_INDEX.TEAL: "teal",
-        WD_COLOR_INDEX.TURQUOISE: "turquoise",
-        WD_COLOR_INDEX.VIOLET: "violet",
-        WD_COLOR_INDEX.WHITE: "white",
-        WD_COLOR_INDEX.YELLOW: "yellow",
-        None: "None"
-    }
-    return highlight_map.get(color_enum, str(color_enum))
-
-def get_rgb_color_name(rgb):
-    rgb_map = {
-        RGBColor(255, 0, 0): "red",
-        RGBColor(0, 255, 0): "green",
-        RGBColor(0, 0, 255): "blue",
-        RGBColor(255, 255, 0): "yellow",
-        RGBColor(0, 0, 0): "black",
-        RGBColor(255, 255, 255): "white",
-        RGBColor(128, 128, 128): "gray",
-        RGBColor(0, 255, 255): "cyan",
-        RGBColor(255, 0, 255): "magenta",
-        None: "None"
-    }
-    return rgb_map.get(rgb, str(rgb))
-
-
 PARA_SIMILARITY_FOR_RUNLEVEL = 0.60  # for 'replace' paragraphs, only check run-level if overall para text is somewhat similar
 
-def get_run_style(run):
-    """Return normalized run-level style values (strings and booleans)."""
-    if run is None:
-        return {
-            'text': '',
-            'bold': False, 'italic': False, 'underline': False,
-            'font_name': "Default", 'font_size': "Default",
-            'font_color': "None", 'highlight': "None"
-        }
-
-    # convert font color to friendly name (use existing mapping function)
-    try:
-        raw_color = run.font.color.rgb if run.font.color and run.font.color.rgb else None
-    except Exception:
-        raw_color = None
-    try:
-        raw_highlight = run.font.highlight_color if run.font.highlight_color else None
-    except Exception:
-        raw_highlight = None
-
-    return {
-        'text': run.text or '',
-        'bold': bool(run.bold),
-        'italic': bool(run.italic),
-        'underline': bool(run.underline),
-        'font_name': run.font.name if run.font.name else "Default",
-        'font_size': run.font.size.pt if run.font.size else "Default",
-        'font_color': get_rgb_color_name(raw_color),
-        'highlight': get_highlight_name(raw_highlight)
-    }
-
-def get_paragraph_info(para):
-    run = para.runs[0] if para.runs else None
-    
-    # Helper maps
-    def get_highlight_name(color_enum):
-        highlight_map = {
-            WD_COLOR_INDEX.AUTO: "auto",
-            WD_COLOR_INDEX.BLACK: "black",
-            WD_COLOR_INDEX.BLUE: "blue",
-            WD_COLOR_INDEX.BRIGHT_GREEN: "bright green",
-            WD_COLOR_INDEX.DARK_BLUE: "dark blue",
-            WD_COLOR_INDEX.DARK_RED: "dark red",
-            WD_COLOR_INDEX.DARK_YELLOW: "dark yellow",
-            WD_COLOR_INDEX.GRAY_25: "gray 25%",
-            WD_COLOR_INDEX.GRAY_50: "gray 50%",
-            WD_COLOR_INDEX.GREEN: "green",
-            WD_COLOR_INDEX.PINK: "pink",
-            WD_COLOR_INDEX.RED: "red",
-            WD_COLOR_INDEX.TEAL: "teal",
-            WD_COLOR_INDEX.TURQUOISE: "turquoise",
-            WD_COLOR_INDEX.VIOLET: "violet",
-            WD_COLOR_INDEX.WHITE: "white",
-            WD_COLOR_INDEX.YELLOW: "yellow",
-            None: "None"
-        }
-        return highlight_map.get(color_enum, str(color_enum))
-
-    def get_rgb_color_name(rgb):
-        rgb_map = {
-            RGBColor(255, 0, 0): "red",
-            RGBColor(0, 255, 0): "green",
-            RGBColor(0, 0, 255): "blue",
-            RGBColor(255, 255, 0): "yellow",
-            RGBColor(0, 0, 0): "black",
-            RGBColor(255, 255, 255): "white",
-            RGBColor(128, 128, 128): "gray",
-            RGBColor(0, 255, 255): "cyan",
-            RGBColor(255, 0, 255): "magenta",
-            None: "None"
-        }
-        return rgb_map.get(rgb, str(rgb))
-
-    return {
-        "text": para.text.strip(),
-        "font_name": run.font.name if run and run.font.name else "Default",
-        "font_size": run.font.size.pt if run and run.font.size else "Default",
-        "bold": run.bold if run else False,
-        "italic": run.italic if run else False,
-        "underline": run.underline if run else False,
-        "highlight": get_highlight_name(run.font.highlight_color) if run else "None",
-        "font_color": get_rgb_color_name(run.font.color.rgb if run and run.font.color and run.font.color.rgb else None),
-        "alignment": get_alignment(para),
-        "spacing": get_line_spacing(para),
-        "left_indent": get_indent(para)[0],
-        "right_indent": get_indent(para)[1]
-    }
-
-def compare_run_styles(r1, r2):
-    """Compare two run-style dicts and return differences dict."""
-    keys = ['bold', 'italic', 'underline', 'font_name', 'font_size', 'font_color', 'highlight', 'text']
-    diffs = {}
-    for k in keys:
-        v1 = r1.get(k, "Default")
-        v2 = r2.get(k, "Default")
-        # normalize None to Default for font attributes
-        if k in ('font_name', 'font_size', 'font_color', 'highlight'):
-            if v1 is None: v1 = "Default"
-            if v2 is None: v2 = "Default"
-        if v1 != v2:
-            diffs[k] = (v1, v2)
-    return diffs
-
-def _compare_format_dicts(d1, d2):
-    
-    keys = ['font_name','font_size','bold','italic','underline','font_color','highlight','alignment','spacing','left_indent','right_indent']
-    diffs = {}
-    for k in keys:
-        v1 = d1.get(k, "Default")
-        v2 = d2.get(k, "Default")
-        # Normalize some common equivalents
-        if v1 is None: v1 = "Default"
-        if v2 is None: v2 = "Default"
-        if v1 != v2:
-            diffs[k] = (v1, v2)
-    return diffs
-
-
-def get_word_diff(old, new):
+def get_word_diff(old, new, vocab=None, chars=False):
+    """
+    "[Word Changed]" lines for the words that differ between two strings. `vocab` (str -> int)
+    can be shared across calls so repeated words are interned once per document; with
+    chars=True a one-word replacement also gets a "[Characters Changed]" line.
+    """
     old_words, new_words = old.split(), new.split()
-    matcher = difflib.SequenceMatcher(None, old_words, new_words)
+    if vocab is None:
+        vocab = {}
     diffs = []
-    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+    for tag, i1, i2, j1, j2 in myers_opcodes(intern_tokens(old_words, vocab), intern_tokens(new_words, vocab)):
         if tag in ['replace', 'insert', 'delete']:
             ow = " ".join(old_words[i1:i2])
             nw = " ".join(new_words[j1:j2])
             if ow != nw:
                 diffs.append(f"[Word Changed] {ow} → {nw}")
+                if chars and i2 - i1 == 1 and j2 - j1 == 1:
+                    diffs.append(f"[Characters Changed] {char_changes(ow, nw)}")
     return diffs
 
-def get_letter_spacing_from_run(run):
-    try:
-        xml = run._element
-        spacing_elem = xml.find('.//w:spacing', namespaces={'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'})
-        if spacing_elem is not None and 'w:val' in spacing_elem.attrib:
-            return spacing_elem.attrib['w:val']
-    except:
-        pass
-    return "Default"
+# ---- token diff (Myers O(ND) over interned token ids) ----
+# Myers keeps one copy of its frontier per edit step, so time and memory grow with D^2. Inputs
+# that need more than MYERS_MAX_EDITS edits (rewritten or unrelated text) go to SequenceMatcher;
+# most are recognised up front from the token counts, which bound D from below.
+MYERS_MAX_EDITS = 64
+
+def intern_tokens(tokens, vocab):
+    return [vocab.setdefault(t, len(vocab)) for t in tokens]
+
+def _framed_matcher_opcodes(A, B, lo, tail):
+    """SequenceMatcher opcodes for the middle A / B, shifted past the common prefix and suffix."""
+    ops = [("equal", 0, lo, 0, lo)] if lo else []
+    ops.extend(
+        (tag, i1 + lo, i2 + lo, j1 + lo, j2 + lo)
+        for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, A, B).get_opcodes()
+    )
+    if tail:
+        ops.append(tail)
+    return ops
+
+def myers_opcodes(a, b):
+    """SequenceMatcher-style opcodes for a shortest edit script between two sequences."""
+    n, m = len(a), len(b)
+    lo = 0
+    while lo < n and lo < m and a[lo] == b[lo]:
+        lo += 1
+    hi_a, hi_b = n, m
+    while hi_a > lo and hi_b > lo and a[hi_a - 1] == b[hi_b - 1]:
+        hi_a -= 1
+        hi_b -= 1
+    A, B = a[lo:hi_a], b[lo:hi_b]
+    N, M = len(A), len(B)
+    tail = ("equal", hi_a, n, hi_b, m) if hi_a < n else None
+    if N + M > MYERS_MAX_EDITS and N + M - 2 * sum((Counter(A) & Counter(B)).values()) > MYERS_MAX_EDITS:
+        return _framed_matcher_opcodes(A, B, lo, tail)
+
+    # forward pass: v[k] = furthest x on diagonal k (k = x - y); one snapshot of v per edit count d
+    v = {1: 0}
+    trace = []
+    for d in range(min(N + M, MYERS_MAX_EDITS) + 1):
+        trace.append(dict(v))
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[k - 1] < v[k + 1]):
+                x = v[k + 1]          # step down: insertion
+            else:
+                x = v[k - 1] + 1      # step right: deletion
+            y = x - k
+            while x < N and y < M and A[x] == B[y]:
+                x += 1
+                y += 1
+            v[k] = x
+            if x >= N and y >= M:
+                break
+        else:
+            continue
+        break
+    else:
+        return _framed_matcher_opcodes(A, B, lo, tail)
+
+    # backtrack into per-element edits ("=", "-", "+"), last to first
+    edits = []
+    x, y = N, M
+    for d in range(len(trace) - 1, 0, -1):
+        vd = trace[d]
+        k = x - y
+        prev_k = k + 1 if (k == -d or (k != d and vd[k - 1] < vd[k + 1])) else k - 1
+        prev_x = vd[prev_k]
+        prev_y = prev_x - prev_k
+        while x > prev_x and y > prev_y:
+            edits.append("=")
+            x -= 1
+            y -= 1
+        edits.append("+" if x == prev_x else "-")
+        x, y = prev_x, prev_y
+    edits.extend("=" * x)
+    edits.reverse()
+
+    # group into opcodes; a run of deletions and insertions becomes one "replace"
+    ops = [("equal", 0, lo, 0, lo)] if lo else []
+    i, j = lo, lo
+    pos = 0
+    while pos < len(edits):
+        if edits[pos] == "=":
+            start = pos
+            while pos < len(edits) and edits[pos] == "=":
+                pos += 1
+            ops.append(("equal", i, i + pos - start, j, j + pos - start))
+            i += pos - start
+            j += pos - start
+            continue
+        dels = ins = 0
+        while pos < len(edits) and edits[pos] != "=":
+            if edits[pos] == "-":
+                dels += 1
+            else:
+                ins += 1
+            pos += 1
+        tag = "replace" if dels and ins else ("delete" if dels else "insert")
+        ops.append((tag, i, i + dels, j, j + ins))
+        i += dels
+        j += ins
+    if tail:
+        ops.append(tail)
+    return ops
+
+def char_changes(old_word, new_word):
+    """old_word with {-removed} and {+added} character runs marked, e.g. colo{-u}r."""
+    out = []
+    for tag, i1, i2, j1, j2 in myers_opcodes(old_word, new_word):
+        if tag == "equal":
+            out.append(old_word[i1:i2])
+            continue
+        if i2 > i1:
+            out.append("{-" + old_word[i1:i2] + "}")
+        if j2 > j1:
+            out.append("{+" + new_word[j1:j2] + "}")
+    return "".join(out)
 
 def detect_spacing_issues(old, new):
     issues = []
@@ -232,10 +179,141 @@ def detect_spacing_issues(old, new):
         issues.append(f"[Letter Spacing Issue] \"{old}\" → \"{new}\"")
     return issues
 
-def fuzzy_compare_lists(list1, list2, label, output_doc):
-    matcher = difflib.SequenceMatcher(None, list1, list2)
+# ---- sequence alignment (patience-style, anchored on unique items) ----
+# Drop-in replacement for SequenceMatcher(None, a, b).get_opcodes() on long lists of hashable
+# items (paragraph texts etc.). Items unique on both sides anchor the alignment, the longest
+# increasing run of anchors is kept, and the gaps between anchors are aligned recursively.
+# Mostly-unchanged documents reduce to prefix/suffix trimming plus one anchor pass, and the
+# result does not depend on SequenceMatcher's autojunk heuristic.
+ALIGN_SMALL_GAP = 400 * 400  # gaps up to this many item pairs fall back to an exact SequenceMatcher
+
+def _longest_increasing_anchors(pairs):
+    """pairs sorted by i; return the longest subsequence with increasing j."""
+    tails, tail_idx, prev = [], [], [None] * len(pairs)
+    for k, (_, j) in enumerate(pairs):
+        pos = bisect_left(tails, j)
+        if pos == len(tails):
+            tails.append(j)
+            tail_idx.append(k)
+        else:
+            tails[pos] = j
+            tail_idx[pos] = k
+        prev[k] = tail_idx[pos - 1] if pos else None
+    out = []
+    k = tail_idx[-1] if tail_idx else None
+    while k is not None:
+        out.append(pairs[k])
+        k = prev[k]
+    out.reverse()
+    return out
+
+def _gap_anchors(a, a_lo, a_hi, b, b_lo, b_hi):
+    count_a, count_b = {}, {}
+    for i in range(a_lo, a_hi):
+        count_a[a[i]] = count_a.get(a[i], 0) + 1
+    for j in range(b_lo, b_hi):
+        count_b[b[j]] = count_b.get(b[j], 0) + 1
+
+    # unique on both sides first; otherwise items repeated the same number of times on both
+    # sides, paired occurrence by occurrence (repeated boilerplate)
+    for accept in (lambda x: count_a[x] == 1 and count_b.get(x) == 1,
+                   lambda x: count_a[x] == count_b.get(x)):
+        seen_b = {}
+        for j in range(b_lo, b_hi):
+            if b[j] in count_a and accept(b[j]):
+                seen_b.setdefault(b[j], []).append(j)
+        if not seen_b:
+            continue
+        taken = {}
+        pairs = []
+        for i in range(a_lo, a_hi):
+            js = seen_b.get(a[i])
+            if js:
+                k = taken.get(a[i], 0)
+                pairs.append((i, js[k]))
+                taken[a[i]] = k + 1
+        return _longest_increasing_anchors(pairs)
+    return []
+
+def align_sequences(a, b):
+    """Opcodes (tag, i1, i2, j1, j2) aligning `a` to `b`, in the format of SequenceMatcher.get_opcodes()."""
+    ops = []
+    stack = [(0, len(a), 0, len(b))]
+    while stack:
+        item = stack.pop()
+        if item[0] == "equal":
+            ops.append(item)
+            continue
+        a_lo, a_hi, b_lo, b_hi = item
+
+        # common prefix / suffix
+        start_a, start_b = a_lo, b_lo
+        while a_lo < a_hi and b_lo < b_hi and a[a_lo] == b[b_lo]:
+            a_lo += 1; b_lo += 1
+        ops.append(("equal", start_a, a_lo, start_b, b_lo))
+        end_a, end_b = a_hi, b_hi
+        while a_lo < a_hi and b_lo < b_hi and a[a_hi - 1] == b[b_hi - 1]:
+            a_hi -= 1; b_hi -= 1
+        suffix = ("equal", a_hi, end_a, b_hi, end_b)
+
+        pending = []  # processed right-to-left from the stack, so pushed in reverse
+        if a_lo == a_hi or b_lo == b_hi:
+            if a_lo < a_hi:
+                ops.append(("delete", a_lo, a_hi, b_lo, b_lo))
+            elif b_lo < b_hi:
+                ops.append(("insert", a_lo, a_lo, b_lo, b_hi))
+        else:
+            anchors = _gap_anchors(a, a_lo, a_hi, b, b_lo, b_hi)
+            if anchors:
+                i_prev, j_prev = a_lo, b_lo
+                for i, j in anchors:
+                    pending.append((i_prev, i, j_prev, j))
+                    pending.append(("equal", i, i + 1, j, j + 1))
+                    i_prev, j_prev = i + 1, j + 1
+                pending.append((i_prev, a_hi, j_prev, b_hi))
+            elif (a_hi - a_lo) * (b_hi - b_lo) <= ALIGN_SMALL_GAP:
+                sm = difflib.SequenceMatcher(None, a[a_lo:a_hi], b[b_lo:b_hi], autojunk=False)
+                for tag, i1, i2, j1, j2 in sm.get_opcodes():
+                    ops.append((tag, a_lo + i1, a_lo + i2, b_lo + j1, b_lo + j2))
+            else:
+                ops.append(("replace", a_lo, a_hi, b_lo, b_hi))
+
+        pending.append(suffix)
+        # keep left-to-right order: the stack pops the last pushed item first
+        stack.extend(reversed(pending))
+
+    return _normalize_opcodes(ops)
+
+def _normalize_opcodes(ops):
+    """Merge adjacent opcodes and split uneven replaces into replace + delete/insert."""
+    merged = []
+    for tag, i1, i2, j1, j2 in ops:
+        if i1 == i2 and j1 == j2:
+            continue
+        if merged:
+            ptag, pi1, pi2, pj1, pj2 = merged[-1]
+            if (ptag == tag) or (ptag != "equal" and tag != "equal"):
+                new_tag = tag if ptag == tag else "replace"
+                merged[-1] = (new_tag, pi1, i2, pj1, j2)
+                continue
+        merged.append((tag, i1, i2, j1, j2))
+
+    out = []
+    for tag, i1, i2, j1, j2 in merged:
+        if tag == "replace" and (i2 - i1) != (j2 - j1):
+            n = min(i2 - i1, j2 - j1)
+            out.append(("replace", i1, i1 + n, j1, j1 + n))
+            if i2 - i1 > n:
+                out.append(("delete", i1 + n, i2, j1 + n, j1 + n))
+            else:
+                out.append(("insert", i1 + n, i1 + n, j1 + n, j2))
+        else:
+            out.append((tag, i1, i2, j1, j2))
+    return out
+
+def fuzzy_compare_lists(list1, list2, label, result):
     table_count = 0
-    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+    for tag, i1, i2, j1, j2 in align_sequences(list1, list2):
         if tag == 'equal':
             continue
         elif tag == 'replace':
@@ -245,15 +323,18 @@ def fuzzy_compare_lists(list1, list2, label, output_doc):
                 if label == "TableRow":
                     table_count += 1
                     heading_label = f"Table {table_count} | Preview: \"{preview}\""
-                output_doc.add_paragraph(heading_label, style="Heading 3")
-                add_colored_paragraph(output_doc, f"[Old {label} {i+1}]", list1[i], (255, 0, 0))
-                add_colored_paragraph(output_doc, f"[New {label} {j+1}]", list2[j], (0, 128, 0))
-                for diff in get_word_diff(list1[i], list2[j]) + detect_spacing_issues(list1[i], list2[j]):
-                    add_colored_paragraph(output_doc, "", diff, (255, 165, 0))
+                diffs = get_word_diff(list1[i], list2[j]) + detect_spacing_issues(list1[i], list2[j])
+                result.add("modified", {"old_line": i + 1, "new_line": j + 1}, list1[i], list2[j], {"diff": diffs}, [
+                    heading_line(heading_label),
+                    colored_line(f"[Old {label} {i+1}]", list1[i], RED),
+                    colored_line(f"[New {label} {j+1}]", list2[j], GREEN),
+                ] + [colored_line("", diff, ORANGE) for diff in diffs])
         elif tag == 'delete':
             for i in range(i1, i2):
-                output_doc.add_paragraph(f"Removed {label} (Line {i+1})", style="Heading 3")
-                add_colored_paragraph(output_doc, f"[Removed {label}]", list1[i], (255, 0, 0))
+                result.add("removed", {"old_line": i + 1}, list1[i], None, None, [
+                    heading_line(f"Removed {label} (Line {i+1})"),
+                    colored_line(f"[Removed {label}]", list1[i], RED),
+                ])
         elif tag == 'insert':
             for j in range(j1, j2):
                 preview = list2[j][:80] + ("..." if len(list2[j]) > 80 else "")
@@ -261,118 +342,902 @@ def fuzzy_compare_lists(list1, list2, label, output_doc):
                 if label == "TableRow":
                     table_count += 1
                     heading_label = f"Table {table_count} | Preview: \"{preview}\""
-                output_doc.add_paragraph(heading_label, style="Heading 3")
-                add_colored_paragraph(output_doc, f"[Added {label}]", list2[j], (0, 128, 0))
+                result.add("added", {"new_line": j + 1}, None, list2[j], None, [
+                    heading_line(heading_label),
+                    colored_line(f"[Added {label}]", list2[j], GREEN),
+                ])
 
 def estimate_paragraph_pages(doc):
-    avg_paragraphs_per_page = 25
-    para_map = []
-    for i, para in enumerate(doc.paragraphs):
-        page = (i // avg_paragraphs_per_page) + 1
-        para_map.append(page)
-    return para_map
+    # page of each body paragraph (same order as doc.paragraphs), from the shared page index
+    return list(get_document_model(doc).pages.paragraphs)
 
-# ===================================== Paragraph Comparison =================================
+# ===================================== Change Records =======================================
+# Comparators describe each difference as a Change (what changed, where, old/new values and
+# details such as style deltas) plus the report lines that present it. A ComparisonResult keeps
+# them in report order and can stream them as NDJSON; the .docx report is rendered from it.
+RED, GREEN, BLUE, ORANGE = (255, 0, 0), (0, 128, 0), (0, 0, 255), (255, 165, 0)
+
+# text plus either a paragraph style (e.g. "Heading 3") or a font color
+ReportLine = namedtuple("ReportLine", "text style color")
+Change = namedtuple("Change", "section kind location old new details lines")
+SectionMark = namedtuple("SectionMark", "key title")
+Note = namedtuple("Note", "text")
+
+def heading_line(text):
+    return ReportLine(text, "Heading 3", None)
+
+def colored_line(label, content, color):
+    return ReportLine(f"{label} {content}", None, color)
+
+def text_line(text, color=None):
+    return ReportLine(text, None, color)
 
-# ---- tiny helpers (scoped inside; no external deps) ----
-rgb_name_map = {
-        (255, 0, 0): "red", (0, 255, 0): "green", (0, 0, 255): "blue",
-        (255, 255, 0): "yellow", (0, 0, 0): "black", (255, 255, 255): "white",
-        (128, 128, 128): "gray", (0, 255, 255): "cyan", (255, 0, 255): "magenta"
+def style_details(diffs):
+    return [{"attr": k, "old": a, "new": b} for k, a, b in diffs]
+
+def style_lines(diffs):
+    return [colored_line(f"[{k.replace('_', ' ').title()} Changed]", f"{a} → {b}", BLUE) for k, a, b in diffs]
+
+def change_to_dict(change):
+    return {
+        "section": change.section,
+        "kind": change.kind,
+        "location": change.location,
+        "old": change.old,
+        "new": change.new,
+        "details": change.details,
     }
-    
-def color_to_name(rgb):
-        if rgb is None:
-            return "None"
+
+class ComparisonResult:
+    """
+    Ordered comparison output: SectionMark, Note and Change items. With `ndjson` (a text stream)
+    every change is written as one JSON line when it is added; keep=False stops retaining items,
+    for runs that only need the NDJSON.
+    """
+
+    def __init__(self, ndjson=None, keep=True):
+        self.items = []
+        self.ndjson = ndjson
+        self.keep = keep
+        self.section_key = None
+
+    def section(self, key, title):
+        self.section_key = key
+        if self.keep:
+            self.items.append(SectionMark(key, title))
+
+    def note(self, text):
+        if self.keep:
+            self.items.append(Note(text))
+
+    def add(self, kind, location=None, old=None, new=None, details=None, lines=()):
+        change = Change(self.section_key, kind, location or {}, old, new, details or {}, list(lines))
+        if self.ndjson is not None:
+            self.ndjson.write(json.dumps(change_to_dict(change), ensure_ascii=False, default=str) + "\n")
+        if self.keep:
+            self.items.append(change)
+        return change
+
+    def records(self):
+        """Kept items as plain dicts (JSON / pickle friendly); add_record() rebuilds them."""
+        out = []
+        for item in self.items:
+            if isinstance(item, SectionMark):
+                out.append({"type": "section", "key": item.key, "title": item.title})
+            elif isinstance(item, Note):
+                out.append({"type": "note", "text": item.text})
+            else:
+                out.append(dict(change_to_dict(item), type="change", lines=[tuple(line) for line in item.lines]))
+        return out
+
+    def add_record(self, rec):
+        if rec["type"] == "section":
+            self.section(rec["key"], rec["title"])
+        elif rec["type"] == "note":
+            self.note(rec["text"])
+        else:
+            lines = [ReportLine(*line) for line in rec["lines"]]
+            self.add(rec["kind"], rec["location"], rec["old"], rec["new"], rec["details"], lines)
+
+    def extend(self, other):
+        """Append the items of another (kept) result, e.g. one section computed elsewhere."""
+        for item in other.items:
+            if isinstance(item, SectionMark):
+                self.section(item.key, item.title)
+            elif isinstance(item, Note):
+                self.note(item.text)
+            else:
+                self.add(item.kind, item.location, item.old, item.new, item.details, item.lines)
+
+    @property
+    def changes(self):
+        return [item for item in self.items if isinstance(item, Change)]
+
+# ===================================== Document Model =======================================
+# One walk over the body XML builds an immutable snapshot of everything the compare_* functions
+# look at, so each comparator reads the model instead of re-walking doc.paragraphs / doc.element.
+# Records hold plain data; python-docx proxies (para / cells / paras) are only present when the
+# model was built from a Document and are None for models produced by the streaming reader.
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+R_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+W_P = qn("w:p")
+W_R = qn("w:r")
+W_PPR = qn("w:pPr")
+W_RPR = qn("w:rPr")
+W_T = qn("w:t")
+W_TAB = qn("w:tab")
+W_CR = qn("w:cr")
+W_PTAB = qn("w:ptab")
+W_NO_BREAK_HYPHEN = qn("w:noBreakHyphen")
+W_HYPERLINK = qn("w:hyperlink")
+W_TBL = qn("w:tbl")
+W_TR = qn("w:tr")
+W_TC = qn("w:tc")
+W_BR = qn("w:br")
+W_TYPE = qn("w:type")
+W_DRAWING = qn("w:drawing")
+W_TXBX_CONTENT = qn("w:txbxContent")
+W_SECT_PR = qn("w:sectPr")
+W_TC_PR = qn("w:tcPr")
+W_VAL = qn("w:val")
+W_B, W_I, W_U = qn("w:b"), qn("w:i"), qn("w:u")
+W_RFONTS, W_ASCII = qn("w:rFonts"), qn("w:ascii")
+W_SZ = qn("w:sz")
+W_COLOR = qn("w:color")
+W_HIGHLIGHT = qn("w:highlight")
+W_SPACING, W_LINE, W_LINE_RULE = qn("w:spacing"), qn("w:line"), qn("w:lineRule")
+W_JC = qn("w:jc")
+W_ASCII_THEME = qn("w:asciiTheme")
+W_STYLE, W_STYLE_ID, W_DEFAULT, W_BASED_ON = qn("w:style"), qn("w:styleId"), qn("w:default"), qn("w:basedOn")
+W_PSTYLE, W_RSTYLE = qn("w:pStyle"), qn("w:rStyle")
+W_DOC_DEFAULTS, W_RPR_DEFAULT, W_PPR_DEFAULT = qn("w:docDefaults"), qn("w:rPrDefault"), qn("w:pPrDefault")
+W_IND, W_LEFT, W_RIGHT, W_START, W_END = qn("w:ind"), qn("w:left"), qn("w:right"), qn("w:start"), qn("w:end")
+A_BLIP = "{http://schemas.openxmlformats.org/drawingml/2006/main}blip"
+A_EXT = "{http://schemas.openxmlformats.org/drawingml/2006/main}ext"
+DRAWING_NS = {
+    'wp': 'http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing',
+    'a': 'http://schemas.openxmlformats.org/drawingml/2006/main',
+    'pic': 'http://schemas.openxmlformats.org/drawingml/2006/picture',
+    'wps': 'http://schemas.microsoft.com/office/word/2010/wordprocessingShape'
+}
+
+ParagraphRec = namedtuple("ParagraphRec", "index text para page digest", defaults=(None,))  # index: 1-based position in doc.paragraphs
+TableRec = namedtuple("TableRec", "index rows cells page digest nested", defaults=(None, ()))
+# rows: norm-spaced cell texts, cells: cell_fingerprint tuples, nested: (row, col, TableRec) per table in a cell
+DrawingRec = namedtuple("DrawingRec", "para_index kind width height")  # kind: "picture", "textbox" or preset geometry
+ImageRec = namedtuple("ImageRec", "para_index rid width height")   # blips inside the direct runs of body paragraphs
+BreakRec = namedtuple("BreakRec", "para_index preview")
+TextboxRec = namedtuple("TextboxRec", "text width height paras page para_index")  # text: non-empty paragraph texts joined by "\n"
+SectionRec = namedtuple("SectionRec", "index headers footers")     # stripped, non-empty paragraph texts
+# Estimated page positions, computed during the model walk (a w:br w:type="page" starts a new page):
+#   blocks: ("paragraph" | "table", page) for every w:p / w:tbl in document order, nested ones included
+#   tables / paragraphs: page of each body-level table / paragraph, by model index
+PageIndex = namedtuple("PageIndex", "blocks tables paragraphs")
+DocumentModel = namedtuple(
+    "DocumentModel",
+    "doc paragraphs tables drawings images breaks textboxes sections pages load_blob styles image_digests digests"
+    " blob_sha1",
+    defaults=(None, None, None),
+)  # styles: style fingerprint cache keyed by w:p element (see style_fingerprint)
+   # image_digests: rid -> (sha1, visual hash), only set on snapshots (see snapshot_model)
+   # digests: part name -> content digest (see model_digests); "images" is added on first use
+   # blob_sha1: rid -> SHA-1 of the image part, filled by image_sha1 as images are hashed
+
+
+# ---- content digests ----
+# Merkle-style hashes: text and run formatting roll up into paragraph / table digests, those into
+# one digest per report part (model.digests). Comparators return early for parts whose digests match
+# and skip matched paragraphs / tables that are equal. Image parts are only read and hashed when the
+# "images" digest is first asked for, so building a model never touches the image blobs.
+def content_digest(*items):
+    h = hashlib.blake2b(digest_size=16)
+    for item in items:
+        h.update(item if isinstance(item, bytes) else repr(item).encode("utf-8"))
+        h.update(b"\x00")
+    return h.digest()
+
+
+def _para_format_key(para):
+    if para is None:
+        return None
+    return para.format_key if isinstance(para, ParaStyle) else format_key(para._p, style_sheet(para.part))
+
+
+def image_sha1(model, rid):
+    """Hex SHA-1 of the image part behind `rid`, hashed once per model; raises if it cannot be read."""
+    if model.image_digests and rid in model.image_digests:
+        return model.image_digests[rid][0]
+    memo = model.blob_sha1 if model.blob_sha1 is not None else {}
+    sha1 = memo.get(rid)
+    if sha1 is None:
+        sha1 = memo[rid] = hashlib.sha1(model.load_blob(rid)).hexdigest()
+    return sha1
+
+
+def _image_digest(model, rec):
+    try:
+        blob_hash = image_sha1(model, rec.rid)
+    except Exception:
+        blob_hash = None
+    return content_digest(rec.para_index, rec.width, rec.height, blob_hash)
+
+
+def model_digests(model):
+    """Content digest per report part; "images" is left to part_digest (it reads the image parts)."""
+    parts = {
+        "paragraphs": content_digest(*(p.digest for p in model.paragraphs if p.text)),
+        "texts": content_digest(*(p.text for p in model.paragraphs if p.text)),
+        "tables": content_digest(*(t.digest for t in model.tables)),
+        "textboxes": content_digest(*(
+            (tb.text, tb.width, tb.height, _para_format_key(tb.paras[0] if tb.paras else None))
+            for tb in model.textboxes
+        )),
+        "headers_footers": content_digest(*((s.index, tuple(s.headers), tuple(s.footers)) for s in model.sections)),
+        "shapes": content_digest(*model.drawings),
+        "page_breaks": content_digest(*model.breaks),
+    }
+    return parts
+
+
+def part_digest(model, part):
+    """model.digests[part], computing the "images" digest on first use; None without digests."""
+    digests = model.digests
+    if not digests:
+        return None
+    if part == "images" and part not in digests:
+        digests[part] = content_digest(*(_image_digest(model, rec) for rec in model.images))
+    return digests.get(part)
+
+
+def parts_identical(doc1, doc2, part):
+    """True when both documents carry equal digests for `part` (a model_digests key or "images")."""
+    d1 = part_digest(get_document_model(doc1), part)
+    return d1 is not None and d1 == part_digest(get_document_model(doc2), part)
+
+
+def norm_space(s):
+    return re.sub(r"\s+", " ", s or "").strip()
+
+
+def emu_to_inches_safe(emu_val):
+    try:
+        return round(int(emu_val) / 914400, 2)
+    except Exception:
+        return None
+
+
+def _direct_run(el, para_el):
+    """Return the w:r child of `para_el` that contains `el`, or None."""
+    node = el
+    while node is not None:
+        parent = node.getparent()
+        if parent is para_el:
+            return node if node.tag == W_R else None
+        node = parent
+    return None
+
+
+def _run_text(r):
+    # mirrors python-docx Run.text for the elements it renders
+    parts = []
+    for el in r.iterchildren():
+        tag = el.tag
+        if tag == W_T:
+            parts.append(el.text or "")
+        elif tag in (W_TAB, W_PTAB):
+            parts.append("\t")
+        elif tag == W_CR or (tag == W_BR and el.get(W_TYPE, "textWrapping") == "textWrapping"):
+            parts.append("\n")
+        elif tag == W_NO_BREAK_HYPHEN:
+            parts.append("-")
+    return "".join(parts)
+
+
+def xml_paragraph_text(p):
+    """Paragraph text read straight from a w:p element (same rules as python-docx Paragraph.text)."""
+    parts = []
+    for child in p.iterchildren(W_R, W_HYPERLINK):
+        if child.tag == W_R:
+            parts.append(_run_text(child))
+        else:
+            parts.extend(_run_text(r) for r in child.iterchildren(W_R))
+    return "".join(parts)
+
+
+def xml_table_grid(tbl):
+    """
+    (rows, tcs): norm-spaced cell texts per row and the w:tc element behind each of them, read
+    from w:tr/w:tc in one pass. Every physical cell appears once: grid columns covered by a
+    gridSpan and vMerge continuations are "" in `rows` and None in `tcs`.
+    """
+    rows, tcs = [], []
+    for tr in tbl.iterchildren(W_TR):
+        row, row_tcs = [], []
+        for tc in tr.iterchildren(W_TC):
+            tcPr = tc.find(W_TC_PR)
+            span_el = tcPr.find(qn("w:gridSpan")) if tcPr is not None else None
+            vmerge = tcPr.find(qn("w:vMerge")) if tcPr is not None else None
+            span = int(span_el.get(W_VAL, 1)) if span_el is not None else 1
+            if vmerge is not None and vmerge.get(W_VAL, "continue") == "continue":
+                row.append("")
+                row_tcs.append(None)
+            else:
+                row.append(norm_space("\n".join(xml_paragraph_text(p) for p in tc.iterchildren(W_P))))
+                row_tcs.append(tc)
+            row.extend([""] * (span - 1))
+            row_tcs.extend([None] * (span - 1))
+        rows.append(tuple(row))
+        tcs.append(row_tcs)
+    return tuple(rows), tcs
+
+
+TABLE_NESTING_LIMIT = 8  # tables nested deeper than this inside cells are left out of the model
+
+def table_record(tbl, index, page, sheet=None, depth=0):
+    """
+    TableRec for a w:tbl with the tables nested in its cells as (row, col, TableRec) entries.
+    With the document's style `sheet` the cells carry formatting fingerprints; the digest covers
+    the whole subtree, so equal nested tables are skipped as a unit.
+    """
+    rows, tcs = xml_table_grid(tbl)
+    cells = None
+    if sheet is not None:
+        cells = tuple(tuple(None if tc is None else cell_fingerprint(tc, sheet) for tc in r) for r in tcs)
+    nested = []
+    if depth < TABLE_NESTING_LIMIT:
+        for r, row in enumerate(tcs):
+            for c, tc in enumerate(row):
+                if tc is None:
+                    continue
+                for inner in tc.iterchildren(W_TBL):
+                    nested.append((r, c, table_record(inner, len(nested), page, sheet, depth + 1)))
+    nested = tuple(nested)
+    if sheet is not None:
+        digest = content_digest(rows, *(n.digest for _, _, n in nested), *(format_key(p, sheet) for p in tbl.iter(W_P)))
+    else:
+        digest = content_digest(rows, *(n.digest for _, _, n in nested))
+    return TableRec(index, rows, cells, page, digest, nested)
+
+
+def _drawing_rec(para_index, drawing):
+    if drawing.find(".//pic:pic", DRAWING_NS) is not None:
+        kind = "picture"
+    elif drawing.find(".//wps:txbx", DRAWING_NS) is not None:
+        kind = "textbox"
+    else:
+        prstGeom = drawing.find(".//a:prstGeom", DRAWING_NS)
+        kind = prstGeom.get('prst') if prstGeom is not None else "unknown"
+    width = height = None
+    extent = drawing.find(".//wp:extent", DRAWING_NS)
+    if extent is not None:
+        width = round(int(extent.get('cx', 0)) / 914400, 2)
+        height = round(int(extent.get('cy', 0)) / 914400, 2)
+    return DrawingRec(para_index, kind, width, height)
+
+
+def _image_rec(para_index, blip):
+    width = height = None
+    drawing = next(blip.iterancestors(W_DRAWING), None)
+    extent = drawing.find(".//wp:extent", DRAWING_NS) if drawing is not None else None
+    if extent is not None:
+        cx, cy = extent.get('cx'), extent.get('cy')
+        width = emu_to_inches_safe(cx) if cx else None
+        height = emu_to_inches_safe(cy) if cy else None
+    return ImageRec(para_index, blip.get('{%s}embed' % R_NS), width, height)
+
+
+def _textbox_rec(txbx, paras, texts, page, para_index):
+    # size comes from an a:ext next to the textbox content, when present
+    width = height = None
+    parent = txbx.getparent()
+    if parent is not None:
+        ext = next(parent.iter(A_EXT), None)
+        if ext is not None:
+            width = emu_to_inches_safe(ext.get("cx"))
+            height = emu_to_inches_safe(ext.get("cy"))
+    text = "\n".join(t.strip() for t in texts if t.strip())
+    return TextboxRec(text, width, height, paras, page, para_index)
+
+
+def _new_scan_state():
+    return {"drawings": [], "images": [], "breaks": [], "textboxes": [], "blocks": [], "page": 1}
+
+
+def _scan_block(block, para_index, para_text, doc, acc):
+    """
+    Collect drawings, textboxes, images and page breaks below one body-level block, plus the
+    ("paragraph" | "table", estimated page) entries of the page index.
+    """
+    drawings, images, breaks, textboxes = acc["drawings"], acc["images"], acc["breaks"], acc["textboxes"]
+    for el in block.iter(W_P, W_TBL, W_DRAWING, W_TXBX_CONTENT, A_BLIP, W_BR):
+        if el.tag == W_P:
+            acc["blocks"].append(("paragraph", acc["page"]))
+        elif el.tag == W_TBL:
+            acc["blocks"].append(("table", acc["page"]))
+        elif el.tag == W_BR and el.get(W_TYPE) == "page":
+            acc["page"] += 1
+            if para_index is not None and _direct_run(el, block) is not None:
+                breaks.append(BreakRec(para_index, para_text[:80]))
+        elif el.tag == W_DRAWING:
+            drawings.append(_drawing_rec(para_index, el))
+        elif el.tag == W_TXBX_CONTENT:
+            if doc is not None:
+                paras = tuple(Paragraph(p, doc) for p in el.iter(W_P))
+                texts = [p.text for p in paras]
+            else:
+                paras = None
+                texts = [xml_paragraph_text(p) for p in el.iter(W_P)]
+            textboxes.append(_textbox_rec(el, paras, texts, acc["page"], para_index))
+        elif el.tag == A_BLIP:
+            if para_index is not None and _direct_run(el, block) is not None:
+                images.append(_image_rec(para_index, el))
+
+
+def _section_texts(doc):
+    sections = []
+    for idx, sec in enumerate(doc.sections):
+        headers = tuple(p.text.strip() for p in sec.header.paragraphs if p.text.strip())
+        footers = tuple(p.text.strip() for p in sec.footer.paragraphs if p.text.strip())
+        sections.append(SectionRec(idx + 1, headers, footers))
+    return tuple(sections)
+
+
+def _page_index(paragraphs, tables, blocks):
+    return PageIndex(tuple(blocks), tuple(t.page for t in tables), tuple(p.page for p in paragraphs))
+
+
+def build_document_model(doc):
+    body = doc.element.body
+    paragraphs, tables = [], []
+    acc = _new_scan_state()
+    sheet = style_sheet(doc.part)
+
+    for child in body.iterchildren():
+        para_index, text = None, ""
+        if child.tag == W_P:
+            para = Paragraph(child, doc._body)
+            para_index = len(paragraphs) + 1
+            text = para.text.strip()
+            digest = content_digest(text, format_key(child, sheet))
+            paragraphs.append(ParagraphRec(para_index, text, para, acc["page"], digest))
+        elif child.tag == W_TBL:
+            tables.append(table_record(child, len(tables), acc["page"], sheet))
+        _scan_block(child, para_index, text, doc, acc)
+
+    related = doc.part.related_parts
+    model = DocumentModel(
+        doc, tuple(paragraphs), tuple(tables), tuple(acc["drawings"]), tuple(acc["images"]),
+        tuple(acc["breaks"]), tuple(acc["textboxes"]), _section_texts(doc),
+        _page_index(paragraphs, tables, acc["blocks"]),
+        lambda rid: related[rid].blob, {}
+    )
+    return model._replace(digests=model_digests(model), blob_sha1={})
+
+
+def get_document_model(doc):
+    """Return the cached DocumentModel for `doc` (built on first use)."""
+    if isinstance(doc, DocumentModel):
+        return doc
+    model = getattr(doc, "_compare_model", None)
+    if model is None:
+        model = build_document_model(doc)
+        doc._compare_model = model
+    return model
+
+
+# ---- streaming reader (iterparse over word/document.xml, bounded memory) ----
+def _read_rels(zf, part_name):
+    """Map relationship id -> zip member name for `part_name` (e.g. "word/document.xml")."""
+    folder, _, name = part_name.rpartition("/")
+    rels_name = f"{folder}/_rels/{name}.rels"
+    if rels_name not in zf.namelist():
+        return {}
+    rels = {}
+    for rel in etree.fromstring(zf.read(rels_name)):
+        target = rel.get("Target", "")
+        if rel.get("TargetMode") == "External":
+            continue
+        member = target.lstrip("/") if target.startswith("/") else f"{folder}/{target}"
+        # resolve "../" segments
+        resolved = []
+        for seg in member.split("/"):
+            if seg == "..":
+                if resolved:
+                    resolved.pop()
+            elif seg and seg != ".":
+                resolved.append(seg)
+        rels[rel.get("Id")] = "/".join(resolved)
+    return rels
+
+
+def _part_paragraph_texts(zf, member):
+    if not member or member not in zf.namelist():
+        return ()
+    root = etree.fromstring(zf.read(member))
+    texts = (xml_paragraph_text(p).strip() for p in root.iterchildren(W_P))
+    return tuple(t for t in texts if t)
+
+
+def iter_document_records(source):
+    """
+    Stream body-level records out of a .docx without building the python-docx object graph.
+
+    Yields ("paragraph", ParagraphRec), ("table", TableRec), ("drawing", DrawingRec),
+    ("image", ImageRec), ("break", BreakRec), ("textbox", TextboxRec), ("block", (kind, page))
+    and ("sectPr", element) in document order. Each body block is cleared once its records have been emitted, so peak
+    memory is bounded by the largest single paragraph/table rather than the whole document.
+    """
+    with ZipFile(source) as zf, zf.open("word/document.xml") as stream:
+        para_count = table_count = 0
+        depth = 0
+        acc = _new_scan_state()
+        for event, el in etree.iterparse(stream, events=("start", "end")):
+            if event == "start":
+                depth += 1
+                continue
+            depth -= 1
+            if depth != 2:  # w:document(0) > w:body(1) > block(2)
+                continue
+
+            para_index, text = None, ""
+            if el.tag == W_P:
+                para_count += 1
+                para_index = para_count
+                text = xml_paragraph_text(el).strip()
+                yield "paragraph", ParagraphRec(para_index, text, None, acc["page"], content_digest(text))
+            elif el.tag == W_TBL:
+                yield "table", table_record(el, table_count, acc["page"])
+                table_count += 1
+
+            _scan_block(el, para_index, text, None, acc)
+            for kind, key in (("drawing", "drawings"), ("image", "images"), ("break", "breaks"),
+                              ("textbox", "textboxes"), ("block", "blocks")):
+                for rec in acc[key]:
+                    yield kind, rec
+                acc[key].clear()
+            sect = el if el.tag == W_SECT_PR else el.find("w:pPr/w:sectPr", {"w": W_NS})
+            if sect is not None:
+                # detached copy: the block it lives in is cleared below
+                yield "sectPr", etree.fromstring(etree.tostring(sect))
+
+            # drop the processed block (and anything before it) from the partial tree
+            el.clear()
+            parent = el.getparent()
+            while el.getprevious() is not None:
+                del parent[0]
+
+
+def _stream_sections(zf, sect_prs):
+    rels = _read_rels(zf, "word/document.xml")
+    ref_tags = (qn("w:headerReference"), qn("w:footerReference"))
+    sections = []
+    prev = {ref_tags[0]: (), ref_tags[1]: ()}
+    for idx, sect in enumerate(sect_prs):
+        current = {}
+        for tag in ref_tags:
+            texts = prev[tag]  # no default reference -> linked to previous section
+            for ref in sect.iterchildren(tag):
+                if ref.get(W_TYPE, "default") == "default":
+                    texts = _part_paragraph_texts(zf, rels.get(ref.get("{%s}id" % R_NS)))
+            current[tag] = texts
+        prev = current
+        sections.append(SectionRec(idx + 1, current[ref_tags[0]], current[ref_tags[1]]))
+    return tuple(sections)
+
+
+def stream_document_model(source):
+    """
+    Build a DocumentModel with iter_document_records (no python-docx Document).
+
+    Text, tables, drawings, images, page breaks and headers/footers are available; formatting
+    checks that need python-docx proxies are skipped by the comparators for such models.
+    """
+    buckets = {k: [] for k in ("paragraph", "table", "drawing", "image", "break", "textbox", "block")}
+    sect_prs = []
+    for kind, rec in iter_document_records(source):
+        if kind == "sectPr":
+            sect_prs.append(rec)
+        else:
+            buckets[kind].append(rec)
+
+    with ZipFile(source) as zf:
+        sections = _stream_sections(zf, sect_prs)
+        rels = _read_rels(zf, "word/document.xml")
+
+    def load_blob(rid):
+        with ZipFile(source) as zf:
+            return zf.read(rels[rid])
+
+    model = DocumentModel(
+        None, tuple(buckets["paragraph"]), tuple(buckets["table"]), tuple(buckets["drawing"]),
+        tuple(buckets["image"]), tuple(buckets["break"]), tuple(buckets["textbox"]),
+        sections, _page_index(buckets["paragraph"], buckets["table"], buckets["block"]), load_blob, {}
+    )
+    return model._replace(digests=model_digests(model), blob_sha1={})
+
+
+def load_document_model(source, streaming=False, snapshot=False):
+    """
+    Open `source` (path or file object) as a DocumentModel, optionally via the streaming reader.
+    With snapshot=True the model is reused from / saved to the on-disk snapshot store.
+    """
+    if snapshot:
+        return load_snapshot_model(source, streaming)
+    if streaming:
+        return stream_document_model(source)
+    return get_document_model(Document(source))
+
+# ===================================== Formatting ===========================================
+# One reader for run and paragraph formatting, shared by paragraphs, textboxes and table cells.
+# Properties come straight from the w:rPr / w:pPr XML (no python-docx proxies), are turned into
+# report values with the name tables below and interned, so equal formatting is one shared record.
+RunFormat = namedtuple("RunFormat", "bold italic underline font_name font_size font_color highlight letter_spacing")
+ParaFormat = namedtuple("ParaFormat", "alignment spacing left_indent right_indent")
+
+COLOR_NAMES = {
+    "FF0000": "red", "00FF00": "green", "0000FF": "blue", "FFFF00": "yellow", "000000": "black",
+    "FFFFFF": "white", "808080": "gray", "00FFFF": "cyan", "FF00FF": "magenta",
+}
+HIGHLIGHT_NAMES = {  # w:highlight values, named after python-docx WD_COLOR_INDEX members
+    "default": "auto", "black": "black", "blue": "blue", "green": "bright green", "darkBlue": "dark blue",
+    "darkRed": "dark red", "darkYellow": "dark yellow", "lightGray": "gray 25%", "darkGray": "gray 50%",
+    "darkGreen": "green", "magenta": "pink", "red": "red", "darkCyan": "teal", "cyan": "turquoise",
+    "darkMagenta": "violet", "white": "white", "yellow": "yellow", "none": "None",
+}
+ALIGNMENT_NAMES = {"left": "LEFT", "center": "CENTER", "right": "RIGHT", "both": "JUSTIFY"}
+DEFAULT_RUN_FORMAT = RunFormat(False, False, False, "Default", "Default", "None", "None", "Default")
+DEFAULT_PARA_FORMAT = ParaFormat("UNKNOWN", "Default", 0.0, 0.0)
+_interned_formats = {}
+
+def _intern(rec):
+    return _interned_formats.setdefault(rec, rec)
+
+def color_name(val):
+    """Name for a w:color value ("FF0000" -> "red"); "auto" and missing values are "None"."""
+    if not val or val == "auto":
+        return "None"
+    val = val.upper()
+    return COLOR_NAMES.get(val, f"#{val}")
+
+def highlight_name(val):
+    if val is None:
+        return "None"
+    return HIGHLIGHT_NAMES.get(val, val)
+
+def _on_off(el):
+    # ST_OnOff: <w:b/> is on, w:val="0" / "false" / "off" is off
+    return el.get(W_VAL) not in ("0", "false", "off")
+
+def _on_off_attr(val):
+    return val is not None and val not in ("0", "false", "off")
+
+# Sizes are plain numbers in the attribute's own unit (half-points for w:sz, twips for w:ind and
+# w:line) or, as OOXML also allows, universal measures such as "12pt" or "1in".
+UNIVERSAL_MEASURE_PT = {"mm": 72 / 25.4, "cm": 72 / 2.54, "in": 72.0, "pt": 1.0, "pc": 12.0, "pi": 12.0}
+_MEASURE = re.compile(r"\s*([-+]?(?:\d+\.?\d*|\.\d+))\s*(mm|cm|in|pt|pc|pi)?\s*")
+
+def _measure(val, units_per_pt):
+    """`val` in its attribute's unit (`units_per_pt` per point); None when it cannot be read."""
+    m = _MEASURE.fullmatch(val or "")
+    if m is None:
+        return None
+    number, unit = m.groups()
+    if unit is None:
+        return float(number) if "." in number else int(number)
+    return float(number) * UNIVERSAL_MEASURE_PT[unit] * units_per_pt
+
+def _rpr_props(rPr, theme_fonts=None):
+    """Report values of the run properties that `rPr` sets explicitly."""
+    props = {}
+    if rPr is None:
+        return props
+    for key, tag in (("bold", W_B), ("italic", W_I)):
+        el = rPr.find(tag)
+        if el is not None:
+            props[key] = _on_off(el)
+    u = rPr.find(W_U)
+    if u is not None:
+        props["underline"] = u.get(W_VAL) not in (None, "none")
+    fonts = rPr.find(W_RFONTS)
+    if fonts is not None:
+        name = fonts.get(W_ASCII)
+        if name is None and theme_fonts and fonts.get(W_ASCII_THEME):
+            name = theme_fonts.get(fonts.get(W_ASCII_THEME)[:5])  # "minorHAnsi" -> "minor"
+        if name:
+            props["font_name"] = name
+    size = rPr.find(W_SZ)
+    if size is not None and size.get(W_VAL):
+        half_points = _measure(size.get(W_VAL), 2)
+        props["font_size"] = "Default" if half_points is None else round(half_points / 2, 2)
+    color = rPr.find(W_COLOR)
+    if color is not None:
+        props["font_color"] = color_name(color.get(W_VAL))
+    highlight = rPr.find(W_HIGHLIGHT)
+    if highlight is not None:
+        props["highlight"] = highlight_name(highlight.get(W_VAL))
+    spacing = rPr.find(W_SPACING)
+    if spacing is not None and spacing.get(W_VAL):
+        props["letter_spacing"] = spacing.get(W_VAL)
+    return props
+
+def _twips_to_cm(val):
+    twips = _measure(val, 20)
+    return "Default" if twips is None else round(twips * 2.54 / 1440, 2)
+
+def _ppr_props(pPr):
+    """Report values of the paragraph properties that `pPr` sets explicitly."""
+    props = {}
+    if pPr is None:
+        return props
+    jc = pPr.find(W_JC)
+    if jc is not None:
+        props["alignment"] = ALIGNMENT_NAMES.get(jc.get(W_VAL), "UNKNOWN")
+    spacing = pPr.find(W_SPACING)
+    line = spacing.get(W_LINE) if spacing is not None else None
+    if line:
+        if spacing.get(W_LINE_RULE, "auto") == "auto":
+            lines = _measure(line, 20)  # 240ths of a line, i.e. twips of a 12pt line
+            props["spacing"] = "Default" if lines is None else round(lines / 240, 2)  # multiple of single spacing
+        else:
+            twips = _measure(line, 20)
+            props["spacing"] = "Default" if twips is None else f"{round(twips / 20, 2)}pt"  # exact / at-least height
+    ind = pPr.find(W_IND)
+    if ind is not None:
+        left, right = ind.get(W_LEFT) or ind.get(W_START), ind.get(W_RIGHT) or ind.get(W_END)
+        if left:
+            props["left_indent"] = _twips_to_cm(left)
+        if right:
+            props["right_indent"] = _twips_to_cm(right)
+    return props
+
+
+# ---- styles.xml cascade ----
+# Effective formatting is docDefaults -> paragraph style -> character style -> direct formatting,
+# each style with its basedOn chain. A StyleSheet resolves every (paragraph style, character
+# style) combination once per document; runs then only merge their own rPr on top.
+# Toggle properties (bold, italic) simply override here instead of flipping against the style.
+STYLE_CHAIN_LIMIT = 32  # basedOn hops followed before a chain is treated as cyclic
+
+class StyleSheet:
+    def __init__(self, styles_el=None, theme_fonts=None):
+        self.theme_fonts = theme_fonts or {}
+        self.styles = {}
+        self.default_paragraph_style = None
+        run_defaults = para_defaults = None
+        if styles_el is not None:
+            for style in styles_el.iterchildren(W_STYLE):
+                self.styles[style.get(W_STYLE_ID)] = style
+                if style.get(W_TYPE) == "paragraph" and _on_off_attr(style.get(W_DEFAULT)):
+                    self.default_paragraph_style = style.get(W_STYLE_ID)
+            defaults = styles_el.find(W_DOC_DEFAULTS)
+            if defaults is not None:
+                run_defaults = defaults.find(f"{W_RPR_DEFAULT}/{W_RPR}")
+                para_defaults = defaults.find(f"{W_PPR_DEFAULT}/{W_PPR}")
+        self.run_defaults = _rpr_props(run_defaults, self.theme_fonts)
+        self.para_defaults = _ppr_props(para_defaults)
+        self._chains = {}
+        self._runs = {}
+        self._paras = {}
+        self._keys = {}
+
+    def _chain(self, style_id, kind):
+        """Merged rPr ("r") or pPr ("p") properties of a style and everything it is based on."""
+        key = (style_id, kind)
+        if key not in self._chains:
+            chain, seen = [], set()
+            while style_id in self.styles and style_id not in seen and len(chain) < STYLE_CHAIN_LIMIT:
+                seen.add(style_id)
+                chain.append(self.styles[style_id])
+                based = self.styles[style_id].find(W_BASED_ON)
+                style_id = based.get(W_VAL) if based is not None else None
+            props = {}
+            for style in reversed(chain):  # root style first, so derived styles override it
+                if kind == "r":
+                    props.update(_rpr_props(style.find(W_RPR), self.theme_fonts))
+                else:
+                    props.update(_ppr_props(style.find(W_PPR)))
+            self._chains[key] = props
+        return self._chains[key]
+
+    def paragraph_style(self, p):
+        pPr = p.find(W_PPR)
+        p_style = pPr.find(W_PSTYLE) if pPr is not None else None
+        return p_style.get(W_VAL) if p_style is not None else self.default_paragraph_style
+
+    def run_props(self, p_style, r_style=None):
+        key = (p_style, r_style)
+        if key not in self._runs:
+            props = dict(self.run_defaults)
+            props.update(self._chain(p_style, "r"))
+            if r_style is not None:
+                props.update(self._chain(r_style, "r"))
+            self._runs[key] = props
+        return self._runs[key]
+
+    def para_props(self, p_style):
+        if p_style not in self._paras:
+            self._paras[p_style] = {**self.para_defaults, **self._chain(p_style, "p")}
+        return self._paras[p_style]
+
+    def style_key(self, p_style, r_style=None):
+        """Resolved run and paragraph properties of a style combination, as a hashable key."""
+        key = (p_style, r_style)
+        if key not in self._keys:
+            self._keys[key] = (
+                tuple(sorted(self.run_props(p_style, r_style).items())),
+                tuple(sorted(self.para_props(p_style).items())),
+            )
+        return self._keys[key]
+
+def style_sheet(part):
+    """StyleSheet of a document part (cached on the part), or None without a part."""
+    if part is None:
+        return None
+    sheet = getattr(part, "_compare_styles", None)
+    if sheet is None:
+        styles_el = theme_fonts = None
         try:
-            tup = (int(rgb[0]), int(rgb[1]), int(rgb[2]))
-            return rgb_name_map.get(tup, f"rgb{tup}")
-        except Exception:
-            return str(rgb) if rgb is not None else "None"
-
-def highlight_to_name(h):
-        table = {
-            WD_COLOR_INDEX.AUTO: "auto", WD_COLOR_INDEX.BLACK: "black",
-            WD_COLOR_INDEX.BLUE: "blue", WD_COLOR_INDEX.BRIGHT_GREEN: "bright green",
-            WD_COLOR_INDEX.DARK_BLUE: "dark blue", WD_COLOR_INDEX.DARK_RED: "dark red",
-            WD_COLOR_INDEX.DARK_YELLOW: "dark yellow", WD_COLOR_INDEX.GRAY_25: "gray 25%",
-            WD_COLOR_INDEX.GRAY_50: "gray 50%", WD_COLOR_INDEX.GREEN: "green",
-            WD_COLOR_INDEX.PINK: "pink", WD_COLOR_INDEX.RED: "red",
-            WD_COLOR_INDEX.TEAL: "teal", WD_COLOR_INDEX.TURQUOISE: "turquoise",
-            WD_COLOR_INDEX.VIOLET: "violet", WD_COLOR_INDEX.WHITE: "white",
-            WD_COLOR_INDEX.YELLOW: "yellow", None: "None"
-        }
-        return table.get(h, str(h))
-
-def get_alignment_name(para):
-        return {
-            WD_ALIGN_PARAGRAPH.LEFT: "LEFT",
-            WD_ALIGN_PARAGRAPH.CENTER: "CENTER",
-            WD_ALIGN_PARAGRAPH.RIGHT: "RIGHT",
-            WD_ALIGN_PARAGRAPH.JUSTIFY: "JUSTIFY",
-            None: "UNKNOWN"
-        }.get(para.alignment, "UNKNOWN")
-
-def get_spacing(para):
-        ls = para.paragraph_format.line_spacing
+            styles_el = part.part_related_by(RT.STYLES).element
+        except (KeyError, AttributeError):
+            pass
         try:
-            return round(float(ls), 2) if ls else "Default"
+            theme = etree.fromstring(part.part_related_by(RT.THEME).blob)
+            theme_fonts = {
+                kind: font.get("typeface")
+                for kind in ("major", "minor")
+                for font in theme.iterfind(f".//a:{kind}Font/a:latin", DRAWING_NS)
+            }
         except Exception:
-            return "Default"
-
-def get_indent_cm(para):
-        pf = para.paragraph_format
-        l = pf.left_indent.cm if pf.left_indent else 0.0
-        r = pf.right_indent.cm if pf.right_indent else 0.0
-        return round(l, 2), round(r, 2)
-
-def dominant_run_style(para):
-        # weight by number of characters per run
-        counts = {
-            "bold": {}, "italic": {}, "underline": {},
-            "font_name": {}, "font_size": {},
-            "font_color": {}, "highlight": {}
-        }
-        for run in para.runs:
-            txt = run.text or ""
-            n = len(txt)
-            if n == 0:
-                continue
+            pass
+        sheet = part._compare_styles = StyleSheet(styles_el, theme_fonts)
+    return sheet
+
+def _props_record(cls, defaults, props):
+    return _intern(cls(*(props.get(k, d) for k, d in zip(cls._fields, defaults))))
 
-            def bump(k, v):
-                counts[k][v] = counts[k].get(v, 0) + n
-
-            b = True if run.bold else False
-            i = True if run.italic else False
-            u = True if bool(run.underline) else False
-            fname = run.font.name if run.font and run.font.name else "Default"
-            fsize = float(run.font.size.pt) if run.font and run.font.size else "Default"
-            fcol = color_to_name(run.font.color.rgb if run.font and run.font.color and run.font.color.rgb else None)
-            hi = highlight_to_name(run.font.highlight_color if run.font and run.font.highlight_color else None)
-
-            bump("bold", b); bump("italic", i); bump("underline", u)
-            bump("font_name", fname); bump("font_size", fsize)
-            bump("font_color", fcol); bump("highlight", hi)
-
-        def pick(k, default):
-            bucket = counts[k]
-            return max(bucket.items(), key=lambda kv: kv[1])[0] if bucket else default
-
-        style = {
-            "bold": pick("bold", False),
-            "italic": pick("italic", False),
-            "underline": pick("underline", False),
-            "font_name": pick("font_name", "Default"),
-            "font_size": pick("font_size", "Default"),
-            "font_color": pick("font_color", "None"),
-            "highlight": pick("highlight", "None"),
-            "alignment": get_alignment_name(para),
-            "spacing": get_spacing(para)
-        }
-        l, r = get_indent_cm(para)
-        style["left_indent"] = l
-        style["right_indent"] = r
-        return style
+def run_format(r, sheet=None, p_style=None):
+    """RunFormat of a w:r element (or None): its rPr over the style cascade when `sheet` is given."""
+    rPr = r.find(W_RPR) if r is not None else None
+    if sheet is None:
+        props = _rpr_props(rPr)
+    else:
+        r_style = rPr.find(W_RSTYLE) if rPr is not None else None
+        props = {**sheet.run_props(p_style, r_style.get(W_VAL) if r_style is not None else None),
+                 **_rpr_props(rPr, sheet.theme_fonts)}
+    return _props_record(RunFormat, DEFAULT_RUN_FORMAT, props)
+
+def paragraph_format(p, sheet=None):
+    """ParaFormat of a w:p element: its pPr over the style cascade when `sheet` is given."""
+    props = _ppr_props(p.find(W_PPR))
+    if sheet is not None:
+        props = {**sheet.para_props(sheet.paragraph_style(p)), **props}
+    return _props_record(ParaFormat, DEFAULT_PARA_FORMAT, props)
+
+def dominant_run_style(para, sheet=None):
+    """Paragraph format plus the run format covering most characters (proxy or w:p element)."""
+    p = getattr(para, "_p", para)
+    if sheet is None and p is not para:
+        sheet = style_sheet(para.part)
+    p_style = sheet.paragraph_style(p) if sheet is not None else None
+    weights = {}
+    for r in p.iterchildren(W_R):
+        n = len(_run_text(r))
+        if n:
+            fmt = run_format(r, sheet, p_style)
+            weights[fmt] = weights.get(fmt, 0) + n
+    # every property is weighted separately, like the report always did
+    style = {}
+    for pos, key in enumerate(RunFormat._fields):
+        if key == "letter_spacing":
+            continue
+        counts = {}
+        for fmt, n in weights.items():
+            counts[fmt[pos]] = counts.get(fmt[pos], 0) + n
+        style[key] = max(counts.items(), key=lambda kv: kv[1])[0] if counts else DEFAULT_RUN_FORMAT[pos]
+    style.update(paragraph_format(p, sheet)._asdict())
+    return style
+
+# ===================================== Paragraph Comparison =================================
 
 def safe_changed(key, a, b):
         # Reduce false-positives: only flag when both sides are explicit or a real boolean flip
@@ -384,49 +1249,111 @@ def safe_changed(key, a, b):
                 return False
         return a != b
 
-def style_diffs(pre, post):
-        keys = [
-            "alignment", "spacing", "left_indent", "right_indent",
-            "bold", "italic", "underline",
-            "font_name", "font_size", "font_color", "highlight"
-        ]
-        diffs = []
-        for k in keys:
-            if safe_changed(k, pre[k], post[k]):
-                diffs.append((k, pre[k], post[k]))
-        return diffs
+# ---- style fingerprints ----
+# A paragraph's dominant style as a tuple in STYLE_KEYS order (the report order). Fingerprints
+# are interned and cached per w:p element; paragraphs whose raw pPr/rPr XML is identical are known
+# to share a style without resolving any run properties at all.
+STYLE_KEYS = (
+    "alignment", "spacing", "left_indent", "right_indent",
+    "bold", "italic", "underline",
+    "font_name", "font_size", "font_color", "highlight"
+)
+_interned_fingerprints = {}
+
+def format_key(p_el, sheet=None):
+    """Raw formatting of a w:p: its pPr plus each run's rPr and text length, and what the styles they
+    use resolve to (so edits elsewhere in styles.xml leave the key alone)."""
+    pPr = p_el.find(W_PPR)
+    p_style = sheet.paragraph_style(p_el) if sheet is not None else None
+    key = [sheet.style_key(p_style) if sheet is not None else (), etree.tostring(pPr) if pPr is not None else b""]
+    for r in p_el.iterchildren(W_R):
+        rPr = r.find(W_RPR)
+        key.append(etree.tostring(rPr) if rPr is not None else b"")
+        key.append(len(_run_text(r)))
+        r_style = rPr.find(W_RSTYLE) if rPr is not None and sheet is not None else None
+        if r_style is not None:
+            key.append(sheet.style_key(p_style, r_style.get(W_VAL)))
+    return tuple(key)
+
+def style_fingerprint(para, cache=None):
+    if para is None:
+        return None
+    p_el = para._p
+    if cache is not None and p_el in cache:
+        return cache[p_el]
+    style = dominant_run_style(para)
+    fp = tuple(style[k] for k in STYLE_KEYS)
+    fp = _interned_fingerprints.setdefault(fp, fp)
+    if cache is not None:
+        cache[p_el] = fp
+    return fp
+
+def fingerprint_diffs(fp1, fp2):
+    if fp1 is None or fp2 is None or fp1 == fp2:
+        return []
+    return [(k, a, b) for k, a, b in zip(STYLE_KEYS, fp1, fp2) if safe_changed(k, a, b)]
+
+# Data-only stand-in for a paragraph proxy, used by model snapshots
+ParaStyle = namedtuple("ParaStyle", "format_key fingerprint")
+
+def para_style(para, cache=None):
+    if para is None or isinstance(para, ParaStyle):
+        return para
+    return ParaStyle(_para_format_key(para), style_fingerprint(para, cache))
+
+def paragraph_style_diffs(p1, p2, cache1=None, cache2=None):
+    """(key, old, new) formatting changes between two paragraphs (proxies or ParaStyles), in STYLE_KEYS
+    order; short-circuits on identical formatting."""
+    if p1 is None or p2 is None:
+        return []  # streamed model: no formatting available
+    if _para_format_key(p1) == _para_format_key(p2):
+        return []
+    fp1 = p1.fingerprint if isinstance(p1, ParaStyle) else style_fingerprint(p1, cache1)
+    fp2 = p2.fingerprint if isinstance(p2, ParaStyle) else style_fingerprint(p2, cache2)
+    return fingerprint_diffs(fp1, fp2)
     # ---- end helpers ----
     
-def compare_paragraphs(doc1, doc2, output_doc):
-    from docx.enum.text import WD_COLOR_INDEX, WD_ALIGN_PARAGRAPH
-    import difflib
-
+def compare_paragraphs(doc1, doc2, result):
     # Keep paragraph objects aligned with their stripped text
-    paras1_objs = [p for p in doc1.paragraphs if p.text.strip()]
-    paras2_objs = [p for p in doc2.paragraphs if p.text.strip()]
-    paras1 = [p.text.strip() for p in paras1_objs]
-    paras2 = [p.text.strip() for p in paras2_objs]
+    model1, model2 = get_document_model(doc1), get_document_model(doc2)
+    recs1 = [p for p in model1.paragraphs if p.text]
+    recs2 = [p for p in model2.paragraphs if p.text]
+    paras1_objs = [p.para for p in recs1]
+    paras2_objs = [p.para for p in recs2]
+    paras1 = [p.text for p in recs1]
+    paras2 = [p.text for p in recs2]
+
+    result.section("paragraphs", "Paragraph Comparison")
+    if parts_identical(doc1, doc2, "paragraphs"):
+        return
+    vocab = {}  # word ids shared by every get_word_diff call below
 
-    output_doc.add_heading("Paragraph Comparison", level=1)
-    sm = difflib.SequenceMatcher(None, paras1, paras2)
+    def where(i, j):
+        loc = {}
+        if i is not None:
+            loc.update(old_paragraph=i + 1, old_page=recs1[i].page)
+        if j is not None:
+            loc.update(paragraph=j + 1, page=recs2[j].page)
+        return loc
 
-    for tag, i1, i2, j1, j2 in sm.get_opcodes():
+    for tag, i1, i2, j1, j2 in align_sequences(paras1, paras2):
         if tag == "equal":
             # Text is identical — show formatting-only changes (using dominant style)
             for idx in range(0, min(i2 - i1, j2 - j1)):
                 if (i1 + idx) >= len(paras1_objs) or (j1 + idx) >= len(paras2_objs):
                     continue
+                if recs1[i1 + idx].digest is not None and recs1[i1 + idx].digest == recs2[j1 + idx].digest:
+                    continue  # same text and run formatting
                 p1 = paras1_objs[i1 + idx]
                 p2 = paras2_objs[j1 + idx]
-                d1 = dominant_run_style(p1)
-                d2 = dominant_run_style(p2)
-                diffs = style_diffs(d1, d2)
+                diffs = paragraph_style_diffs(p1, p2, model1.styles, model2.styles)
                 if diffs:
                     preview = paras2[j1 + idx][:80] + ("..." if len(paras2[j1 + idx]) > 80 else "")
-                    output_doc.add_paragraph(f"Paragraph {j1 + idx + 1} | Preview: \"{preview}\"", style="Heading 3")
-                    for k, a, b in diffs:
-                        label = f"[{k.replace('_', ' ').title()} Changed]"
-                        add_colored_paragraph(output_doc, label, f"{a} → {b}", (0, 0, 255))
+                    result.add(
+                        "formatting", where(i1 + idx, j1 + idx), None, paras2[j1 + idx],
+                        {"formatting": style_details(diffs)},
+                        [heading_line(f"Paragraph {j1 + idx + 1} | Preview: \"{preview}\"")] + style_lines(diffs),
+                    )
             continue
 
         # For replace/delete/insert, keep your original behavior + add safe style diffs on replace
@@ -443,37 +1370,41 @@ def compare_paragraphs(doc1, doc2, output_doc):
 
             if i is not None and j is not None:
                 preview = new[:80] + ("..." if len(new) > 80 else "")
-                output_doc.add_paragraph(f"Paragraph {j + 1} | Preview: \"{preview}\"", style="Heading 3")
-                add_colored_paragraph(output_doc, "[Old Paragraph]", old, (255, 0, 0))
-                add_colored_paragraph(output_doc, "[New Paragraph]", new, (0, 128, 0))
-
                 # word changes + spacing issues (your existing helpers)
-                for diff in get_word_diff(old, new) + detect_spacing_issues(old, new):
-                    add_colored_paragraph(output_doc, "", diff, (255, 165, 0))
-
+                word_diffs = get_word_diff(old, new, vocab) + detect_spacing_issues(old, new)
                 # dominant style diffs (safe)
-                if i < len(paras1_objs) and j < len(paras2_objs):
-                    d1 = dominant_run_style(paras1_objs[i])
-                    d2 = dominant_run_style(paras2_objs[j])
-                    for k, a, b in style_diffs(d1, d2):
-                        label = f"[{k.replace('_', ' ').title()} Changed]"
-                        add_colored_paragraph(output_doc, label, f"{a} → {b}", (0, 0, 255))
+                diffs = paragraph_style_diffs(paras1_objs[i], paras2_objs[j], model1.styles, model2.styles)
+                result.add(
+                    "modified", where(i, j), old, new,
+                    {"diff": word_diffs, "formatting": style_details(diffs)},
+                    [
+                        heading_line(f"Paragraph {j + 1} | Preview: \"{preview}\""),
+                        colored_line("[Old Paragraph]", old, RED),
+                        colored_line("[New Paragraph]", new, GREEN),
+                    ]
+                    + [colored_line("", diff, ORANGE) for diff in word_diffs]
+                    + style_lines(diffs),
+                )
 
             elif i is not None:
-                output_doc.add_paragraph(f"Removed Paragraph (Line {i + 1})", style="Heading 3")
-                add_colored_paragraph(output_doc, "[Removed Paragraph]", old, (255, 0, 0))
+                result.add("removed", where(i, None), old, None, None, [
+                    heading_line(f"Removed Paragraph (Line {i + 1})"),
+                    colored_line("[Removed Paragraph]", old, RED),
+                ])
 
             elif j is not None:
                 preview = new[:80] + ("..." if len(new) > 80 else "")
-                output_doc.add_paragraph(f"Added Paragraph {j + 1} | Preview: \"{preview}\"", style="Heading 3")
-                add_colored_paragraph(output_doc, "[Added Paragraph]", new, (0, 128, 0))
+                result.add("added", where(None, j), None, new, None, [
+                    heading_line(f"Added Paragraph {j + 1} | Preview: \"{preview}\""),
+                    colored_line("[Added Paragraph]", new, GREEN),
+                ])
 
 # ======================================= Textbox Comparison ============================================
 def extract_textbox_paragraphs_with_pages(docx_path):
     paragraphs_with_pages = []
     try:
-        with ZipFile(docx_path) as docx:
-            xml_content = docx.read("word/document.xml")
+        with ZipFile(docx_path) as zf:
+            xml_content = zf.read("word/document.xml")
             tree = etree.fromstring(xml_content)
             namespaces = {
                 'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main',
@@ -493,9 +1424,9 @@ def extract_textbox_paragraphs_with_pages(docx_path):
     return paragraphs_with_pages
 
 def get_textbox_estimated_page(doc, idx):
-    
-    # Very naive: index // 5 ≈ page grouping, adjust if needed
-    return (idx // 5) + 1
+    # page of the body block holding the idx-th textbox (as returned by extract_textboxes)
+    textboxes = extract_textboxes(doc)
+    return textboxes[idx].page if 0 <= idx < len(textboxes) else 1
 
 
 # --- constants ---
@@ -512,89 +1443,81 @@ def emu_to_inches(emu_val):
 
 # --- extractor ---
 def extract_textboxes(doc):
-   
-    EMU_PER_INCH = 914400
-    def emu_to_inches(emu_val):
-        try:
-            return round(int(emu_val) / EMU_PER_INCH, 2)
-        except Exception:
-            return None
-
-    TXBX = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}txbxContent"
-    PARA = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}p"
-    EXT  = "{http://schemas.openxmlformats.org/drawingml/2006/main}ext"
-
+    # TextboxRec entries from the document model, with duplicates (e.g. the VML fallback copy
+    # of a DrawingML textbox) dropped
     seen = set()
     textboxes = []
 
-    for shape in doc.element.iter(TXBX):
-        paras = []
-        for p in shape.iter(PARA):
-            try:
-                paras.append(Paragraph(p, doc))
-            except Exception:
-                pass
-
-        # normalize all text in this textbox
-        full_text = "\n".join([p.text.strip() for p in paras if p.text.strip()])
-
-        width = height = None
-        parent = shape.getparent()
-        if parent is not None:
-            ext_elems = list(parent.iter(EXT))
-            if ext_elems:
-                cx = ext_elems[0].get("cx")
-                cy = ext_elems[0].get("cy")
-                width = emu_to_inches(cx)
-                height = emu_to_inches(cy)
-
+    for tb in get_document_model(doc).textboxes:
         # dedup key
-        sig = (full_text, width, height)
+        sig = (tb.text, tb.width, tb.height)
         if sig in seen:
             continue
         seen.add(sig)
 
-        textboxes.append((shape, paras, width, height))
+        textboxes.append(tb)
 
     return textboxes
 
 
-def compare_textboxes(doc1, doc2, output_doc):
+def compare_textboxes(doc1, doc2, result):
     from difflib import SequenceMatcher
 
-    output_doc.add_heading("Textbox Comparison", level=1)
+    result.section("textboxes", "Textbox Comparison")
+    if parts_identical(doc1, doc2, "textboxes"):
+        return
 
     tb1 = extract_textboxes(doc1)
     tb2 = extract_textboxes(doc2)
+    cache1, cache2 = get_document_model(doc1).styles, get_document_model(doc2).styles
+
+    def first_para_diffs(paras1, paras2):
+        return paragraph_style_diffs(paras1[0] if paras1 else None, paras2[0] if paras2 else None, cache1, cache2)
+
+    texts1 = [tb.text for tb in tb1]
+    texts2 = [tb.text for tb in tb2]
+
+    def size_details(w1, h1, w2, h2):
+        return {"size": {"old": [w1, h1], "new": [w2, h2]}} if (w1 != w2 or h1 != h2) else {}
+
+    def removed(ii):
+        old_text = texts1[ii]
+        result.add("removed", {"old_textbox": ii + 1, "old_page": tb1[ii].page}, old_text, None, None, [
+            heading_line(f"[Removed Textbox {ii+1}] | Page {tb1[ii].page} | Preview: \"{old_text[:80]}\""),
+            colored_line("[Removed Textbox]", old_text, RED),
+        ])
+
+    def added(jj):
+        new_text = texts2[jj]
+        w, h = tb2[jj].width, tb2[jj].height
+        lines = [
+            heading_line(f"[Added Textbox {jj+1}] | Page {tb2[jj].page} | Preview: \"{new_text[:80]}\""),
+            colored_line("[Added Textbox]", new_text, GREEN),
+        ]
+        if w and h:
+            lines.append(colored_line("[Size]", f"{w}×{h}", GREEN))
+        result.add("added", {"textbox": jj + 1, "page": tb2[jj].page}, None, new_text, {"size": [w, h]}, lines)
 
-    texts1 = ["\n".join(p.text.strip() for p in paras if p.text.strip()) for (_, paras, _, _) in tb1]
-    texts2 = ["\n".join(p.text.strip() for p in paras if p.text.strip()) for (_, paras, _, _) in tb2]
-
-    sm = SequenceMatcher(None, texts1, texts2)
-
-    for tag, i1, i2, j1, j2 in sm.get_opcodes():
+    for tag, i1, i2, j1, j2 in align_sequences(texts1, texts2):
         if tag == "equal":
             # check formatting-only or size-only diffs
             for k in range(0, min(i2 - i1, j2 - j1)):
-                _, paras1, w1, h1 = tb1[i1 + k]
-                _, paras2, w2, h2 = tb2[j1 + k]
-
-                d1 = dominant_run_style(paras1[0]) if paras1 else {}
-                d2 = dominant_run_style(paras2[0]) if paras2 else {}
+                w1, h1, paras1 = tb1[i1 + k].width, tb1[i1 + k].height, tb1[i1 + k].paras
+                w2, h2, paras2 = tb2[j1 + k].width, tb2[j1 + k].height, tb2[j1 + k].paras
 
-                diffs = style_diffs(d1, d2)
+                diffs = first_para_diffs(paras1, paras2)
                 size_changed = (w1 != w2 or h1 != h2)
 
                 if diffs or size_changed:
                     preview = texts2[j1 + k][:80]
-                    output_doc.add_paragraph(f"[Modified Textbox {j1 + k + 1}] | Preview: \"{preview}\"", style="Heading 3")
-
-                    for (key, a, b) in diffs:
-                        label = f"[{key.replace('_',' ').title()} Changed]"
-                        add_colored_paragraph(output_doc, label, f"{a} → {b}", (0, 0, 255))
-
+                    lines = [heading_line(f"[Modified Textbox {j1 + k + 1}] | Page {tb2[j1 + k].page} | Preview: \"{preview}\"")]
+                    lines += style_lines(diffs)
                     if size_changed:
-                        add_colored_paragraph(output_doc, "[Size Changed]", f"{w1}×{h1} → {w2}×{h2}", (0, 0, 255))
+                        lines.append(colored_line("[Size Changed]", f"{w1}×{h1} → {w2}×{h2}", BLUE))
+                    result.add(
+                        "formatting", {"textbox": j1 + k + 1, "page": tb2[j1 + k].page}, None, texts2[j1 + k],
+                        dict(formatting=style_details(diffs), **size_details(w1, h1, w2, h2)), lines,
+                    )
 
         elif tag == "replace":
             for ii, jj in zip(range(i1, i2), range(j1, j2)):
@@ -604,78 +1527,65 @@ def compare_textboxes(doc1, doc2, output_doc):
                 # 🚨 check similarity — if too different, treat as remove + add
                 sm_ratio = SequenceMatcher(None, old_text, new_text).ratio()
                 if sm_ratio < 0.4:  # threshold (tweakable)
-                    # Removed
-                    output_doc.add_paragraph(f"[Removed Textbox {ii+1}] | Preview: \"{old_text[:80]}\"", style="Heading 3")
-                    add_colored_paragraph(output_doc, "[Removed Textbox]", old_text, (255, 0, 0))
-
-                    # Added
-                    _, _, w, h = tb2[jj]
-                    output_doc.add_paragraph(f"[Added Textbox {jj+1}] | Preview: \"{new_text[:80]}\"", style="Heading 3")
-                    add_colored_paragraph(output_doc, "[Added Textbox]", new_text, (0, 128, 0))
-                    if w and h:
-                        add_colored_paragraph(output_doc, "[Size]", f"{w}×{h}", (0, 128, 0))
+                    removed(ii)
+                    added(jj)
                     continue
 
                 # Otherwise treat as modified
-                _, paras1, w1, h1 = tb1[ii]
-                _, paras2, w2, h2 = tb2[jj]
+                w1, h1, paras1 = tb1[ii].width, tb1[ii].height, tb1[ii].paras
+                w2, h2, paras2 = tb2[jj].width, tb2[jj].height, tb2[jj].paras
 
                 preview = new_text[:80]
-                output_doc.add_paragraph(f"[Modified Textbox {jj+1}] | Preview: \"{preview}\"", style="Heading 3")
-                add_colored_paragraph(output_doc, "[Old Textbox]", old_text, (255, 0, 0))
-                add_colored_paragraph(output_doc, "[New Textbox]", new_text, (0, 128, 0))
-
-                for diff in get_word_diff(old_text, new_text) + detect_spacing_issues(old_text, new_text):
-                    add_colored_paragraph(output_doc, "", diff, (255, 165, 0))
-
-                d1 = dominant_run_style(paras1[0]) if paras1 else {}
-                d2 = dominant_run_style(paras2[0]) if paras2 else {}
-                for (key, a, b) in style_diffs(d1, d2):
-                    add_colored_paragraph(output_doc, f"[{key.title()} Changed]", f"{a} → {b}", (0, 0, 255))
-
+                word_diffs = get_word_diff(old_text, new_text) + detect_spacing_issues(old_text, new_text)
+                diffs = first_para_diffs(paras1, paras2)
+                lines = [
+                    heading_line(f"[Modified Textbox {jj+1}] | Page {tb2[jj].page} | Preview: \"{preview}\""),
+                    colored_line("[Old Textbox]", old_text, RED),
+                    colored_line("[New Textbox]", new_text, GREEN),
+                ]
+                lines += [colored_line("", diff, ORANGE) for diff in word_diffs]
+                lines += [colored_line(f"[{key.title()} Changed]", f"{a} → {b}", BLUE) for key, a, b in diffs]
                 if (w1 != w2 or h1 != h2):
-                    add_colored_paragraph(output_doc, "[Size Changed]", f"{w1}×{h1} → {w2}×{h2}", (0, 0, 255))
+                    lines.append(colored_line("[Size Changed]", f"{w1}×{h1} → {w2}×{h2}", BLUE))
+                result.add(
+                    "modified",
+                    {"old_textbox": ii + 1, "old_page": tb1[ii].page, "textbox": jj + 1, "page": tb2[jj].page},
+                    old_text, new_text,
+                    dict(diff=word_diffs, formatting=style_details(diffs), **size_details(w1, h1, w2, h2)), lines,
+                )
 
         elif tag == "delete":
             for ii in range(i1, i2):
-                old_text = texts1[ii]
-                output_doc.add_paragraph(f"[Removed Textbox {ii+1}] | Preview: \"{old_text[:80]}\"", style="Heading 3")
-                add_colored_paragraph(output_doc, "[Removed Textbox]", old_text, (255, 0, 0))
+                removed(ii)
 
         elif tag == "insert":
             for jj in range(j1, j2):
-                new_text = texts2[jj]
-                _, _, w, h = tb2[jj]
-                output_doc.add_paragraph(f"[Added Textbox {jj+1}] | Preview: \"{new_text[:80]}\"", style="Heading 3")
-                add_colored_paragraph(output_doc, "[Added Textbox]", new_text, (0, 128, 0))
-                if w and h:
-                    add_colored_paragraph(output_doc, "[Size]", f"{w}×{h}", (0, 128, 0))
+                added(jj)
 
 
 
 # ============================= Header and Footer =========================================
-def compare_headers_footers(doc1, doc2, output_doc):
-    output_doc.add_heading("Header/Footer Comparison", level=1)
+def compare_headers_footers(doc1, doc2, result):
+    result.section("headers_footers", "Header/Footer Comparison")
+    if parts_identical(doc1, doc2, "headers_footers"):
+        return
     
     def get_section_paragraphs(doc, attr):
         items = []
-        for idx, sec in enumerate(doc.sections):
-            paras = getattr(sec, attr).paragraphs
-            for p in paras:
-                if p.text.strip():
-                    items.append((idx + 1, p.text.strip()))
+        for sec in get_document_model(doc).sections:
+            for text in getattr(sec, attr):
+                items.append((sec.index, text))
         return items
 
-    headers1 = get_section_paragraphs(doc1, 'header')
-    headers2 = get_section_paragraphs(doc2, 'header')
-    footers1 = get_section_paragraphs(doc1, 'footer')
-    footers2 = get_section_paragraphs(doc2, 'footer')
+    headers1 = get_section_paragraphs(doc1, 'headers')
+    headers2 = get_section_paragraphs(doc2, 'headers')
+    footers1 = get_section_paragraphs(doc1, 'footers')
+    footers2 = get_section_paragraphs(doc2, 'footers')
 
     def compare_parts(part1, part2, label):
         texts1 = [t[1] for t in part1]
         texts2 = [t[1] for t in part2]
-        matcher = difflib.SequenceMatcher(None, texts1, texts2)
-        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        for tag, i1, i2, j1, j2 in align_sequences(texts1, texts2):
             if tag == 'equal':
                 continue
             elif tag == 'replace':
@@ -683,11 +1593,16 @@ def compare_headers_footers(doc1, doc2, output_doc):
                     sec1 = part1[i][0]
                     sec2 = part2[j][0]
                     preview = texts2[j][:80] + ("..." if len(texts2[j]) > 80 else "")
-                    output_doc.add_paragraph(f"{label} - Section {sec2} | Preview: \"{preview}\"", style="Heading 3")
-                    add_colored_paragraph(output_doc, f"[Old {label}]", texts1[i], (255, 0, 0))
-                    add_colored_paragraph(output_doc, f"[New {label}]", texts2[j], (0, 128, 0))
-                    for diff in get_word_diff(texts1[i], texts2[j]) + detect_spacing_issues(texts1[i], texts2[j]):
-                        add_colored_paragraph(output_doc, "", diff, (255, 165, 0))
+                    diffs = get_word_diff(texts1[i], texts2[j]) + detect_spacing_issues(texts1[i], texts2[j])
+                    result.add(
+                        "modified", {"part": label.lower(), "old_section": sec1, "section": sec2},
+                        texts1[i], texts2[j], {"diff": diffs},
+                        [
+                            heading_line(f"{label} - Section {sec2} | Preview: \"{preview}\""),
+                            colored_line(f"[Old {label}]", texts1[i], RED),
+                            colored_line(f"[New {label}]", texts2[j], GREEN),
+                        ] + [colored_line("", diff, ORANGE) for diff in diffs],
+                    )
             elif tag == 'delete':
                 removed = {}
                 for i in range(i1, i2):
@@ -695,231 +1610,290 @@ def compare_headers_footers(doc1, doc2, output_doc):
                     sec = part1[i][0]
                     removed.setdefault(txt, []).append(str(sec))
                 for txt, secs in removed.items():
-                    output_doc.add_paragraph(
-    f"[Removed {label}] {txt}→ Removed from Sections: {', '.join(secs)}",
-    style="Heading 3"
-)
+                    result.add("removed", {"part": label.lower(), "old_sections": [int(s) for s in secs]}, txt, None, None, [
+                        heading_line(f"[Removed {label}] {txt}→ Removed from Sections: {', '.join(secs)}"),
+                    ])
             elif tag == 'insert':
                 for j in range(j1, j2):
                     sec = part2[j][0]
                     preview = texts2[j][:80] + ("..." if len(texts2[j]) > 80 else "")
-                    output_doc.add_paragraph(f"Added {label} - Section {sec} | Preview: \"{preview}\"", style="Heading 3")
-                    add_colored_paragraph(output_doc, f"[Added {label}]", texts2[j], (0, 128, 0))
+                    result.add("added", {"part": label.lower(), "section": sec}, None, texts2[j], None, [
+                        heading_line(f"Added {label} - Section {sec} | Preview: \"{preview}\""),
+                        colored_line(f"[Added {label}]", texts2[j], GREEN),
+                    ])
 
     compare_parts(headers1, headers2, "Header")
     compare_parts(footers1, footers2, "Footer")
 
 # ================================== Table Comparison =================================================
 
-def get_cell_style(cell):
-    style = {
-        "text": cell.text.strip(),
-        "font_name": "Default",
-        "font_size": "Default",
-        "bold": False,
-        "italic": False,
-        "underline": False,
-        "highlight": None,
-        "font_color": None,
-        "alignment": "UNKNOWN",
-        "spacing": "Default",
-        "left_indent": 0.0,
-        "right_indent": 0.0,
-        "letter_spacing": "Default"
-    }
-    if cell.paragraphs:
-        para = cell.paragraphs[0]
-        run = para.runs[0] if para.runs else None
-        pf = para.paragraph_format
-        if run:
-            spacing_val = get_letter_spacing_from_run(run)
-            # Safe mappings
-            highlight_val = run.font.highlight_color
-            highlight_name = str(highlight_val).split('.')[-1] if highlight_val else None
-            font_color_val = run.font.color.rgb
-            font_color_name = None
-            if font_color_val:
-                font_color_name = str(font_color_val).lower()
-
-            style.update({
-                "font_name": run.font.name or "Default",
-                "font_size": run.font.size.pt if run.font.size else "Default",
-                "bold": True if run.bold else False,
-                "italic": True if run.italic else False,
-                "underline": True if run.underline else False,
-                "highlight": highlight_name,
-                "font_color": font_color_name,
-                "alignment": get_alignment(para),
-                "spacing": round(pf.line_spacing, 2) if pf.line_spacing else "Default",
-                "left_indent": round(pf.left_indent.cm, 2) if pf.left_indent else 0.0,
-                "right_indent": round(pf.right_indent.cm, 2) if pf.right_indent else 0.0,
-                "letter_spacing": spacing_val
-            })
-    return style
-
-def estimate_pages_with_breaks(doc):
-    page_number = 1
-    block_page_map = []
-    for block in doc.element.body.iter():
-        if block.tag.endswith("}br") and block.attrib.get('{http://schemas.openxmlformats.org/wordprocessingml/2006/main}type') == 'page':
-            page_number += 1
-        elif block.tag.endswith("}p"):
-            block_page_map.append(("paragraph", page_number))
-        elif block.tag.endswith("}tbl"):
-            block_page_map.append(("table", page_number))
-    return block_page_map
-
 def get_table_estimated_page(doc, table_index):
-    pages = estimate_pages_with_breaks(doc)
-    table_count = -1
-    for block_type, page in pages:
-        if block_type == "table":
-            table_count += 1
-            if table_count == table_index:
-                return page
-    return 1
-
-def compare_tables(doc1, doc2, output_doc):
-    import difflib
-    from docx.shared import RGBColor
+    # O(1) lookup in the page index built with the document model
+    pages = get_document_model(doc).pages.tables
+    return pages[table_index] if 0 <= table_index < len(pages) else 1
+
+# ---- table match candidates ----
+# Instead of scoring every (old, new) table pair with a character-level SequenceMatcher, candidate
+# pairs come from blocking keys (identical signature, header row, dimension bucket and MinHash LSH
+# bands over cell tokens) once there are too many pairs to try them all, and each candidate is
+# pruned with SequenceMatcher's real_quick_ratio / quick_ratio upper bounds before the full ratio.
+TABLE_ALL_PAIRS_LIMIT = 256 * 256  # up to this many pairs every pair is a candidate
+TABLE_BUCKET_CAP = 32             # larger header / dimension buckets are too unselective to be useful
+TABLE_LSH_COMMON_SHARE = 0.05     # tokens in more than this share of all tables (labels, units) are not hashed
+TABLE_CELL_SIM_CHARS = 200        # autojunk spoils char ratios from here on; longer signatures compare cells
+# 32 bands of 2 rows: tables sharing 40% of their tokens collide in some band with p = 1 - (1 - 0.4**2)**32 > 0.99.
+# Short bands are only selective because tokens common to many tables are dropped before hashing.
+MINHASH_BANDS, MINHASH_ROWS = 32, 2
+_MERSENNE_61 = (1 << 61) - 1
+_MINHASH_PARAMS = [
+    (0x5bd1e995 + 2 * k * 0x9e3779b1 + 1, 0x7f4a7c15 + k * 0x632be5ab)
+    for k in range(MINHASH_BANDS * MINHASH_ROWS)
+]
+
+def table_shape_similarity(dim1, dim2):
+    rows1, cols1 = dim1
+    rows2, cols2 = dim2
+    return 1.0 if (rows1 == rows2 and cols1 == cols2) else 0.6 if (rows1 == rows2 or cols1 == cols2) else 0.0
+
+def _token_hash(token):
+    # stable across processes, unlike hash() on str (PYTHONHASHSEED)
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big") & _MERSENNE_61
+
+def _minhash_bands(tokens):
+    hashes = [_token_hash(t) for t in tokens]
+    if not hashes:
+        return []
+    sig = [min((a * h + b) % _MERSENNE_61 for h in hashes) for a, b in _MINHASH_PARAMS]
+    return [tuple(sig[k * MINHASH_ROWS:(k + 1) * MINHASH_ROWS]) for k in range(MINHASH_BANDS)]
+
+def _table_tokens(sig):
+    return set(sig.replace("|", " ").split())
+
+def _table_blocking_keys(rows, sig, dims, tokens):
+    keys = [("sig", sig)]
+    if rows and any(rows[0]):
+        keys.append(("header", rows[0]))
+    keys.append(("dims", dims))
+    keys.extend(("lsh", band, value) for band, value in enumerate(_minhash_bands(tokens)))
+    return keys
+
+def table_match_candidates(rows1, rows2, sig1, sig2, dim1, dim2):
+    """(i, j) pairs worth scoring; all pairs for small inputs, blocked pairs otherwise."""
+    n1, n2 = len(sig1), len(sig2)
+    if n1 * n2 <= TABLE_ALL_PAIRS_LIMIT:
+        return {(i, j) for i in range(n1) for j in range(n2)}
+
+    # tokens shared by most tables (row labels, headers, units) would put every pair in one band
+    tokens1, tokens2 = [_table_tokens(s) for s in sig1], [_table_tokens(s) for s in sig2]
+    tables_with = Counter(t for tokens in tokens1 + tokens2 for t in tokens)
+    limit = max(2, TABLE_LSH_COMMON_SHARE * (n1 + n2))
+    common = {t for t, count in tables_with.items() if count > limit}
+
+    buckets = {}
+    for j in range(n2):
+        for key in _table_blocking_keys(rows2[j], sig2[j], dim2[j], tokens2[j] - common):
+            buckets.setdefault(key, []).append(j)
+    candidates = set()
+    for i in range(n1):
+        for key in _table_blocking_keys(rows1[i], sig1[i], dim1[i], tokens1[i] - common):
+            js = buckets.get(key, ())
+            if key[0] in ("header", "dims") and len(js) > TABLE_BUCKET_CAP:
+                continue
+            candidates.update((i, j) for j in js)
+    return candidates
+
+def score_table_candidates(sig1, sig2, dim1, dim2, candidates, threshold):
+    """(score, i, j) for candidates scoring >= threshold; score = 0.85 * text + 0.15 * shape."""
+    by_new = {}
+    for i, j in candidates:
+        by_new.setdefault(j, []).append(i)
+
+    def cells(sig):
+        return sig.replace("||", "|").split("|")
+
+    scored = []
+    sm = difflib.SequenceMatcher(None)
+    cell_sm = difflib.SequenceMatcher(None, autojunk=False)
+    for j, olds in by_new.items():
+        # b-side analysis is cached across all old tables
+        sm.set_seq2(sig2[j])
+        cell_sm.set_seq2(cells(sig2[j]))
+        for i in olds:
+            shape_sim = table_shape_similarity(dim1[i], dim2[j])
+            if sig1[i] == sig2[j]:
+                scored.append((0.85 + 0.15 * shape_sim, i, j))
+                continue
+            if max(len(sig1[i]), len(sig2[j])) >= TABLE_CELL_SIM_CHARS:
+                cell_sm.set_seq1(cells(sig1[i]))
+                if 0.85 * cell_sm.real_quick_ratio() + 0.15 * shape_sim < threshold:
+                    continue
+                if 0.85 * cell_sm.quick_ratio() + 0.15 * shape_sim < threshold:
+                    continue
+                sc = 0.85 * cell_sm.ratio() + 0.15 * shape_sim
+                if sc >= threshold:
+                    scored.append((sc, i, j))
+                continue
+            sm.set_seq1(sig1[i])
+            if 0.85 * sm.real_quick_ratio() + 0.15 * shape_sim < threshold:
+                continue
+            if 0.85 * sm.quick_ratio() + 0.15 * shape_sim < threshold:
+                continue
+            sc = 0.85 * sm.ratio() + 0.15 * shape_sim
+            if sc >= threshold:
+                scored.append((sc, i, j))
+    return scored
+
+# ---- row / column alignment ----
+# Matched tables are diffed like paragraphs: columns are aligned on their content (or their header
+# cell when that pairs up more columns), rows are aligned on their cells in the aligned columns, and
+# only the rows left over on both sides are paired by similarity and diffed cell by cell. One row
+# inserted at the top of a long table is then one added row instead of a changed cell in every row.
+TABLE_ROW_PAIR_RATIO = 0.5  # leftover rows at least this similar are diffed as one modified row
+TABLE_ROW_PAIR_WINDOW = 32  # new rows tried per leftover old row
+
+def _cell(row, c):
+    return row[c] if c < len(row) else None
+
+def _aligned_pairs(keys1, keys2):
+    """(old, new) index pairs from align_sequences, plus the leftover regions to pair up by hand."""
+    vocab = {}
+    pairs, regions = [], []
+    for tag, i1, i2, j1, j2 in align_sequences(intern_tokens(keys1, vocab), intern_tokens(keys2, vocab)):
+        if tag == "equal":
+            pairs.extend(zip(range(i1, i2), range(j1, j2)))
+        elif regions and regions[-1][1] == i1 and regions[-1][3] == j1:
+            regions[-1] = (regions[-1][0], i2, regions[-1][2], j2)  # replace + delete/insert
+        else:
+            regions.append((i1, i2, j1, j2))
+    return pairs, regions
+
+def _intact_row_pairs(rows1, rows2):
+    """(old, new) rows paired by align_sequences on the cell values both tables share, keeping only
+    rows whose cells all survive on one side, i.e. rows changed at most by added / removed columns."""
+    shared = {c for r in rows1 for c in r if c} & {c for r in rows2 for c in r if c}
+
+    def keys(rows):
+        out = []
+        for r in rows:
+            cells = sorted(c for c in r if c)
+            kept = [c for c in cells if c in shared]
+            out.append((tuple(kept), len(kept) == len(cells)))
+        return out
+
+    keys1, keys2 = keys(rows1), keys(rows2)
+    pairs, _ = _aligned_pairs([k for k, _ in keys1], [k for k, _ in keys2])
+    return [(i, j) for i, j in pairs if keys1[i][0] and (keys1[i][1] or keys2[j][1])]
+
+def align_table_columns(rows1, rows2):
+    """Sorted (old col, new col) pairs; columns missing from them were removed / added."""
+    c1 = max((len(r) for r in rows1), default=0)
+    c2 = max((len(r) for r in rows2), default=0)
+    if c1 == c2 and rows1 == rows2:
+        return [(c, c) for c in range(c1)]
+    # column contents over the rows both tables still have in common, over all rows, or the header
+    # cell; added rows and edited cells spoil the latter two, so the key that pairs most columns wins
+    intact = _intact_row_pairs(rows1, rows2)
+    keyings = []
+    if intact:
+        keyings.append((
+            lambda c: tuple(_cell(rows1[i], c) for i, _ in intact),
+            lambda c: tuple(_cell(rows2[j], c) for _, j in intact),
+        ))
+    keyings.append((lambda c: tuple(_cell(r, c) for r in rows1), lambda c: tuple(_cell(r, c) for r in rows2)))
+    if rows1 and rows2:
+        keyings.append((lambda c: _cell(rows1[0], c), lambda c: _cell(rows2[0], c)))  # header cell
+    best = None
+    for key1, key2 in keyings:
+        pairs, regions = _aligned_pairs([key1(c) for c in range(c1)], [key2(c) for c in range(c2)])
+        if best is None or len(pairs) > len(best[0]):
+            best = (pairs, regions)
+    pairs, regions = best
+    for i1, i2, j1, j2 in regions:
+        # a replaced column keeps its place; only the surplus counts as removed / added
+        pairs.extend(zip(range(i1, i2), range(j1, j2)))
+    return sorted(pairs)
+
+def align_table_rows(rows1, rows2, col_pairs):
+    """(old row, new row, same) triples in order; same=True when the aligned cells are equal."""
+    keys1 = [tuple(_cell(r, a) for a, _ in col_pairs) for r in rows1]
+    keys2 = [tuple(_cell(r, b) for _, b in col_pairs) for r in rows2]
+    pairs, regions = _aligned_pairs(keys1, keys2)
+    out = [(i, j, True) for i, j in pairs]
+    sm = difflib.SequenceMatcher(None)
+    for i1, i2, j1, j2 in regions:
+        if i2 - i1 == j2 - j1:
+            out.extend((i, j, False) for i, j in zip(range(i1, i2), range(j1, j2)))
+            continue
+        # uneven region: pair rows in order with the first similar enough candidate
+        start = j1
+        for i in range(i1, i2):
+            sm.set_seq2(" | ".join(t for t in keys1[i] if t))
+            for j in range(start, min(j2, start + TABLE_ROW_PAIR_WINDOW)):
+                sm.set_seq1(" | ".join(t for t in keys2[j] if t))
+                if sm.real_quick_ratio() >= TABLE_ROW_PAIR_RATIO and sm.quick_ratio() >= TABLE_ROW_PAIR_RATIO \
+                        and sm.ratio() >= TABLE_ROW_PAIR_RATIO:
+                    out.append((i, j, False))
+                    start = j + 1
+                    break
+    return sorted(out)
+
+# ---- cell formatting ----
+# Cell formatting as a tuple in CELL_STYLE_KEYS order: the paragraph format and first run format
+# of the first paragraph that has a run (over the style cascade), interned so equal cells share one tuple.
+CELL_STYLE_KEYS = (
+    "alignment", "spacing", "left_indent", "right_indent",
+    "font_name", "font_size", "bold", "italic", "underline",
+    "font_color", "highlight", "letter_spacing",
+)
+_cell_fingerprints = {}
 
-    output_doc.add_heading("Table Comparison", level=1)
+def cell_fingerprint(tc, sheet=None):
+    paras = list(tc.iterchildren(W_P))
+    p = next((p for p in paras if p.find(W_R) is not None), paras[0] if paras else None)
+    if p is None:
+        para, run = DEFAULT_PARA_FORMAT, DEFAULT_RUN_FORMAT
+    else:
+        para = paragraph_format(p, sheet)
+        run = run_format(p.find(W_R), sheet, sheet.paragraph_style(p) if sheet is not None else None)
+    key = (para, run)
+    fp = _cell_fingerprints.get(key)
+    if fp is None:
+        values = {**para._asdict(), **run._asdict()}
+        fp = _cell_fingerprints.setdefault(key, tuple(values[k] for k in CELL_STYLE_KEYS))
+    return fp
+
+
+def compare_tables(doc1, doc2, result):
+    result.section("tables", "Table Comparison")
+    if parts_identical(doc1, doc2, "tables"):
+        return
+    vocab = {}  # word ids shared by every get_word_diff call below
 
-    tables1 = list(doc1.tables)
-    tables2 = list(doc2.tables)
+    # TableRec entries: cell texts are extracted once by the document model
+    tables1 = list(get_document_model(doc1).tables)
+    tables2 = list(get_document_model(doc2).tables)
 
     # ---------- local helpers (self-contained) ----------
-    def norm_space(s: str) -> str:
-        return re.sub(r"\s+", " ", s or "").strip()
+    signatures = {}  # id(TableRec) -> signature, so nested tables are joined once however often they are matched
 
     def table_signature(tbl) -> str:
-        parts = []
-        for r in tbl.rows:
-            row_parts = []
-            for c in r.cells:
-                row_parts.append(norm_space(c.text))
-            parts.append("|".join(row_parts))
-        return "||".join(parts)
+        sig = signatures.get(id(tbl))
+        if sig is None:
+            sig = signatures[id(tbl)] = "||".join("|".join(row) for row in tbl.rows)
+        return sig
 
     def table_dims(tbl):
         rows = len(tbl.rows)
-        cols = len(tbl.rows[0].cells) if rows else 0
+        cols = len(tbl.rows[0]) if rows else 0
         return rows, cols
 
     def preview_text(tbl) -> str:
-        try:
-            for r in tbl.rows:
-                for c in r.cells:
-                    t = norm_space(c.text)
-                    if t:
-                        return t[:80]
-        except Exception:
-            pass
+        for row in tbl.rows:
+            for t in row:
+                if t:
+                    return t[:80]
         return ""
 
-    # color + highlight name helpers (no global deps)
-    def rgb_name(rgb):
-        if not rgb:
-            return "None"
-        try:
-            r, g, b = rgb[0], rgb[1], rgb[2]
-        except Exception:
-            # python-docx RGBColor may be bytes-like or object; try attributes
-            r, g, b = getattr(rgb, "r", None), getattr(rgb, "g", None), getattr(rgb, "b", None)
-        if None in (r, g, b):
-            return "None"
-        known = {
-            (255, 0, 0): "red",
-            (0, 255, 0): "green",
-            (0, 0, 255): "blue",
-            (255, 255, 0): "yellow",
-            (0, 0, 0): "black",
-            (255, 255, 255): "white",
-            (128, 128, 128): "gray",
-            (0, 255, 255): "cyan",
-            (255, 0, 255): "magenta",
-        }
-        name = known.get((r, g, b))
-        return name if name else f"#{r:02X}{g:02X}{b:02X}"
-
-    def highlight_name(h):
-        from docx.enum.text import WD_COLOR_INDEX
-        m = {
-            WD_COLOR_INDEX.AUTO: "auto",
-            WD_COLOR_INDEX.BLACK: "black",
-            WD_COLOR_INDEX.BLUE: "blue",
-            WD_COLOR_INDEX.BRIGHT_GREEN: "bright green",
-            WD_COLOR_INDEX.DARK_BLUE: "dark blue",
-            WD_COLOR_INDEX.DARK_RED: "dark red",
-            WD_COLOR_INDEX.DARK_YELLOW: "dark yellow",
-            WD_COLOR_INDEX.GRAY_25: "gray 25%",
-            WD_COLOR_INDEX.GRAY_50: "gray 50%",
-            WD_COLOR_INDEX.GREEN: "green",
-            WD_COLOR_INDEX.PINK: "pink",
-            WD_COLOR_INDEX.RED: "red",
-            WD_COLOR_INDEX.TEAL: "teal",
-            WD_COLOR_INDEX.TURQUOISE: "turquoise",
-            WD_COLOR_INDEX.VIOLET: "violet",
-            WD_COLOR_INDEX.WHITE: "white",
-            WD_COLOR_INDEX.YELLOW: "yellow",
-            None: "None",
-        }
-        return m.get(h, str(h))
-
-    def to_bool(x):
-        return True if x is True else False
-
-    def first_para_and_run(cell):
-        # pick the first paragraph that has at least one run; fall back to first paragraph
-        if not cell.paragraphs:
-            return None, None
-        for p in cell.paragraphs:
-            if p.runs:
-                return p, p.runs[0]
-        return cell.paragraphs[0], None
-
-    def get_cell_style_safe(cell):
-        style = {
-            "font_name": "Default",
-            "font_size": "Default",
-            "bold": False,
-            "italic": False,
-            "underline": False,
-            "font_color": "None",
-            "highlight": "None",
-            "alignment": "UNKNOWN",
-            "spacing": "Default",
-            "left_indent": 0.0,
-            "right_indent": 0.0,
-            "letter_spacing": "Default",
-        }
-        p, r = first_para_and_run(cell)
-        if p:
-            style["alignment"] = get_alignment(p)
-            style["spacing"] = get_line_spacing(p)
-            li, ri = get_indent(p)
-            style["left_indent"] = li
-            style["right_indent"] = ri
-        if r:
-            # font properties (normalize to avoid None noise)
-            style["bold"] = to_bool(r.bold)
-            style["italic"] = to_bool(r.italic)
-            style["underline"] = to_bool(r.underline)
-            style["font_name"] = r.font.name or "Default"
-            style["font_size"] = r.font.size.pt if r.font.size else "Default"
-            style["highlight"] = highlight_name(r.font.highlight_color if r.font else None)
-            style["font_color"] = rgb_name(r.font.color.rgb if r.font and r.font.color and r.font.color.rgb else None)
-            style["letter_spacing"] = get_letter_spacing_from_run(r)
-        return style
-
-    def similarity_score(sig1, sig2, dim1, dim2):
-        # mix of text similarity + shape similarity
-        text_sim = difflib.SequenceMatcher(None, sig1, sig2).ratio()
-        rows1, cols1 = dim1
-        rows2, cols2 = dim2
-        shape_sim = 1.0 if (rows1 == rows2 and cols1 == cols2) else 0.6 if (rows1 == rows2 or cols1 == cols2) else 0.0
-        return 0.85 * text_sim + 0.15 * shape_sim
-
     def build_match_map(tables1, tables2, threshold=0.65):
         # greedy best-match pairing with threshold
         sig1 = [table_signature(t) for t in tables1]
@@ -928,11 +1902,11 @@ def compare_tables(doc1, doc2, output_doc):
         dim2 = [table_dims(t) for t in tables2]
 
         pairs = []
-        candidates = []
-        for i in range(len(tables1)):
-            for j in range(len(tables2)):
-                sc = similarity_score(sig1[i], sig2[j], dim1[i], dim2[j])
-                candidates.append((sc, i, j))
+        candidate_pairs = table_match_candidates(
+            [t.rows for t in tables1], [t.rows for t in tables2], sig1, sig2, dim1, dim2
+        )
+        # only pairs that can reach the threshold are scored in full
+        candidates = score_table_candidates(sig1, sig2, dim1, dim2, candidate_pairs, threshold)
         # highest score first
         candidates.sort(reverse=True)
 
@@ -952,6 +1926,123 @@ def compare_tables(doc1, doc2, output_doc):
         unmatched_old = [i for i in range(len(tables1)) if i not in old_to_new]
         unmatched_new = [j for j in range(len(tables2)) if j not in new_to_old]
         return old_to_new, new_to_old, unmatched_old, unmatched_new
+
+    def report_removed(i):
+        page_est = get_table_estimated_page(doc1, i)
+        prev1 = preview_text(tables1[i])
+        result.add("removed", {"old_table": i + 1, "old_page": page_est}, prev1, None, None, [
+            text_line(f"[Removed Table {i+1}] | Page {page_est} | Preview: \"{prev1}\"", RED),
+        ])
+
+    def report_added(j):
+        page_est = get_table_estimated_page(doc2, j)
+        prev2 = preview_text(tables2[j])
+        result.add("added", {"table": j + 1, "page": page_est}, None, prev2, None, [
+            text_line(f"[Added Table {j+1}] | Page {page_est} | Preview: \"{prev2}\"", GREEN),
+        ])
+
+    def diff_tables(t1, t2):
+        """(table_changes, details) for a matched pair; nested tables are matched and diffed the same way."""
+        table_changes = []
+        details = {"cells": [], "formatting": []}
+
+        # shape changes (rows/cols added/removed)
+        r1, c1 = table_dims(t1)
+        r2, c2 = table_dims(t2)
+        if r1 != r2:
+            table_changes.append(f"[Rows Changed] {r1} → {r2}")
+            details["rows"] = {"old": r1, "new": r2}
+        if c1 != c2:
+            table_changes.append(f"[Columns Changed] {c1} → {c2}")
+            details["columns"] = {"old": c1, "new": c2}
+
+        col_pairs = align_table_columns(t1.rows, t2.rows)
+        row_pairs = align_table_rows(t1.rows, t2.rows, col_pairs)
+        old_cols = {a for a, _ in col_pairs}
+        new_cols = {b for _, b in col_pairs}
+        old_rows = {r for r, _, _ in row_pairs}
+        new_rows = {r for _, r, _ in row_pairs}
+        header1 = t1.rows[0] if t1.rows else ()
+        header2 = t2.rows[0] if t2.rows else ()
+        for c in range(c1):
+            if c not in old_cols:
+                table_changes.append(f"[Column Removed] {c+1}: {_cell(header1, c) or ''}")
+                details.setdefault("columns_removed", []).append(c + 1)
+        for c in range(c2):
+            if c not in new_cols:
+                table_changes.append(f"[Column Added] {c+1}: {_cell(header2, c) or ''}")
+                details.setdefault("columns_added", []).append(c + 1)
+        for r in range(r1):
+            if r not in old_rows:
+                table_changes.append(f"[Row Removed] {r+1}: {' | '.join(t1.rows[r])}")
+                details.setdefault("rows_removed", []).append(r + 1)
+        for r in range(r2):
+            if r not in new_rows:
+                table_changes.append(f"[Row Added] {r+1}: {' | '.join(t2.rows[r])}")
+                details.setdefault("rows_added", []).append(r + 1)
+
+        check_formatting = t1.cells is not None and t2.cells is not None
+        for old_r, r_idx, same in row_pairs:
+            if same and not check_formatting:
+                continue
+            for old_c, c_idx in col_pairs:
+                text1 = _cell(t1.rows[old_r], old_c)
+                text2 = _cell(t2.rows[r_idx], c_idx)
+                if text1 is None or text2 is None:
+                    continue  # ragged row
+
+                if text1 != text2:
+                    # textual diffs + spacing diagnostics
+                    table_changes.append(f"[Cell ({r_idx+1},{c_idx+1}) Old] {text1}")
+                    table_changes.append(f"[Cell ({r_idx+1},{c_idx+1}) New] {text2}")
+                    # cells are often single values (amounts, codes), so one-word edits are spelled out per character
+                    diffs = get_word_diff(text1, text2, vocab, chars=True) + detect_spacing_issues(text1, text2)
+                    for diff in diffs:
+                        table_changes.append(f"  {diff}")
+                    details["cells"].append(
+                        {"row": r_idx + 1, "col": c_idx + 1, "old_row": old_r + 1, "old_col": old_c + 1,
+                         "old": text1, "new": text2, "diff": diffs}
+                    )
+                elif check_formatting:
+                    # only if text equal, check formatting deltas (safe, minimal noise)
+                    s1 = t1.cells[old_r][old_c]
+                    s2 = t2.cells[r_idx][c_idx]
+                    if s1 is s2 or s1 is None or s2 is None:
+                        continue  # interned fingerprints: same formatting (None: merged slot)
+                    for key, a, b in zip(CELL_STYLE_KEYS, s1, s2):
+                        if a != b:
+                            table_changes.append(f"  [{key.replace('_',' ').title()} Changed] {a} → {b}")
+                            details["formatting"].append(
+                                {"row": r_idx + 1, "col": c_idx + 1, "attr": key, "old": a, "new": b}
+                            )
+
+        # tables inside cells: same matching engine, one level down
+        nested1 = [n for _, _, n in t1.nested]
+        nested2 = [n for _, _, n in t2.nested]
+        if nested1 or nested2:
+            n_old_to_new, _, n_removed, n_added = build_match_map(nested1, nested2)
+            for k in n_removed:
+                r, c, n = t1.nested[k]
+                table_changes.append(f"[Removed Nested Table {k+1}] Cell ({r+1},{c+1}) | Preview: \"{preview_text(n)}\"")
+                details.setdefault("nested_removed", []).append({"table": k + 1, "row": r + 1, "col": c + 1})
+            for k in n_added:
+                r, c, n = t2.nested[k]
+                table_changes.append(f"[Added Nested Table {k+1}] Cell ({r+1},{c+1}) | Preview: \"{preview_text(n)}\"")
+                details.setdefault("nested_added", []).append({"table": k + 1, "row": r + 1, "col": c + 1})
+            for k1, k2 in sorted(n_old_to_new.items(), key=lambda kv: kv[1]):
+                n1, n2 = nested1[k1], nested2[k2]
+                if n1.digest is not None and n1.digest == n2.digest:
+                    continue
+                inner_changes, inner_details = diff_tables(n1, n2)
+                if inner_changes:
+                    r, c, _ = t2.nested[k2]
+                    table_changes.append(f"[Modified Nested Table {k2+1}] Cell ({r+1},{c+1}) | Preview: \"{preview_text(n2)}\"")
+                    table_changes.extend(f"  {ch}" for ch in inner_changes)
+                    details.setdefault("nested", []).append(
+                        {"old_table": k1 + 1, "table": k2 + 1, "row": r + 1, "col": c + 1, **inner_details}
+                    )
+        return table_changes, details
+
     # ---------- end helpers ----------
 
     old_to_new, new_to_old, unmatched_old, unmatched_new = build_match_map(tables1, tables2)
@@ -964,21 +2055,13 @@ def compare_tables(doc1, doc2, output_doc):
     while i < n_old or j < n_new:
         # handle removed tables (in order)
         if i < n_old and i not in old_to_new:
-            t1 = tables1[i]
-            page_est = get_table_estimated_page(doc1, i)
-            prev1 = preview_text(t1)
-            p = output_doc.add_paragraph(f"[Removed Table {i+1}] | Page {page_est} | Preview: \"{prev1}\"")
-            p.runs[0].font.color.rgb = RGBColor(255, 0, 0)
+            report_removed(i)
             i += 1
             continue
 
         # handle added tables that appear before the next matched pair
         if j < n_new and j not in new_to_old:
-            t2 = tables2[j]
-            page_est = get_table_estimated_page(doc2, j)
-            prev2 = preview_text(t2)
-            p = output_doc.add_paragraph(f"[Added Table {j+1}] | Page {page_est} | Preview: \"{prev2}\"")
-            p.runs[0].font.color.rgb = RGBColor(0, 128, 0)
+            report_added(j)
             j += 1
             continue
 
@@ -986,62 +2069,33 @@ def compare_tables(doc1, doc2, output_doc):
         if i < n_old and j < n_new and old_to_new.get(i) == j:
             t1 = tables1[i]
             t2 = tables2[j]
+            if t1.digest is not None and t1.digest == t2.digest:
+                i += 1
+                j += 1
+                continue  # same cell texts and formatting
             page_est = get_table_estimated_page(doc2, j)
             prev2 = preview_text(t2)
-
-            table_changes = []
-
-            # shape changes (rows/cols added/removed)
-            r1, c1 = table_dims(t1)
-            r2, c2 = table_dims(t2)
-            if r1 != r2:
-                table_changes.append(f"[Rows Changed] {r1} → {r2}")
-            if c1 != c2:
-                table_changes.append(f"[Columns Changed] {c1} → {c2}")
-
-            # compare only intersection to avoid index errors
-            min_rows = min(r1, r2)
-            min_cols = min(c1, c2)
-
-            for r_idx in range(min_rows):
-                for c_idx in range(min_cols):
-                    # ✅ SAFETY GUARD for cell access
-                    try:
-                        cell1 = t1.cell(r_idx, c_idx)
-                        cell2 = t2.cell(r_idx, c_idx)
-                    except IndexError:
-                        continue
-
-                    text1 = norm_space(cell1.text)
-                    text2 = norm_space(cell2.text)
-
-                    if text1 != text2:
-                        # textual diffs + spacing diagnostics
-                        table_changes.append(f"[Cell ({r_idx+1},{c_idx+1}) Old] {text1}")
-                        table_changes.append(f"[Cell ({r_idx+1},{c_idx+1}) New] {text2}")
-                        for diff in get_word_diff(text1, text2) + detect_spacing_issues(text1, text2):
-                            table_changes.append(f"  {diff}")
-                    else:
-                        # only if text equal, check formatting deltas (safe, minimal noise)
-                        s1 = get_cell_style_safe(cell1)
-                        s2 = get_cell_style_safe(cell2)
-                        for key in [
-                            "alignment", "spacing", "left_indent", "right_indent",
-                            "font_name", "font_size", "bold", "italic", "underline",
-                            "font_color", "highlight", "letter_spacing"
-                        ]:
-                            if s1.get(key) != s2.get(key):
-                                table_changes.append(f"  [{key.replace('_',' ').title()} Changed] {s1.get(key)} → {s2.get(key)}")
+            table_changes, details = diff_tables(t1, t2)
 
             if table_changes:
-                output_doc.add_paragraph(f"[Modified Table {j+1}] | Page {page_est} | Preview: \"{prev2}\"", style="Heading 3")
+                lines = [heading_line(f"[Modified Table {j+1}] | Page {page_est} | Preview: \"{prev2}\"")]
                 for ch in table_changes:
-                    if ch.startswith("[Cell") and " Old]" in ch:
-                        add_colored_paragraph(output_doc, "", ch, (255, 0, 0))
-                    elif ch.startswith("[Cell") and " New]" in ch:
-                        add_colored_paragraph(output_doc, "", ch, (0, 128, 0))
+                    head = ch.lstrip()  # nested table changes are indented
+                    if head.startswith("[Cell") and " Old]" in head:
+                        lines.append(colored_line("", ch, RED))
+                    elif head.startswith("[Cell") and " New]" in head:
+                        lines.append(colored_line("", ch, GREEN))
+                    elif head.startswith(("[Row Removed]", "[Column Removed]", "[Removed Nested Table")):
+                        lines.append(colored_line("", ch, RED))
+                    elif head.startswith(("[Row Added]", "[Column Added]", "[Added Nested Table")):
+                        lines.append(colored_line("", ch, GREEN))
                     else:
-                        add_colored_paragraph(output_doc, "", ch, (255, 165, 0))
+                        lines.append(colored_line("", ch, ORANGE))
+                result.add(
+                    "modified",
+                    {"old_table": i + 1, "old_page": get_table_estimated_page(doc1, i), "table": j + 1, "page": page_est},
+                    preview_text(t1), prev2, details, lines,
+                )
 
             i += 1
             j += 1
@@ -1053,216 +2107,373 @@ def compare_tables(doc1, doc2, output_doc):
             target_j = old_to_new.get(i, None)
             if target_j is not None and target_j > j:
                 # there are added tables before the mapped one
-                t2 = tables2[j]
-                page_est = get_table_estimated_page(doc2, j)
-                prev2 = preview_text(t2)
-                p = output_doc.add_paragraph(f"[Added Table {j+1}] | Page {page_est} | Preview: \"{prev2}\"")
-                p.runs[0].font.color.rgb = RGBColor(0, 128, 0)
+                report_added(j)
                 j += 1
             else:
                 # treat the old table as removed
-                t1 = tables1[i]
-                page_est = get_table_estimated_page(doc1, i)
-                prev1 = preview_text(t1)
-                p = output_doc.add_paragraph(f"[Removed Table {i+1}] | Page {page_est} | Preview: \"{prev1}\"")
-                p.runs[0].font.color.rgb = RGBColor(255, 0, 0)
+                report_removed(i)
                 i += 1
 
 # =============================== Image Comparison ========================================
 EMU_PER_INCH = 914400
 
-def emu_to_inches_img(emu):
+
+# ---- visual hash + persistent cache ----
+def compute_visual_hash(blob):
+    """8x8 average hash of an image blob plus its pixel size: (vhash, (w, h)); (None, None) if undecodable."""
     try:
-        return round(int(emu) / EMU_PER_INCH, 2)
+        from PIL import Image
     except Exception:
-        return None
+        return None, None
+    try:
+        img = Image.open(io.BytesIO(blob))
+        size = img.size
+        # JPEGs decode straight at 1/2..1/8 scale (DCT scaling); other formats ignore the hint
+        img.draft('L', (64, 64))
+        img = img.convert('L')
+        # resize to 8x8
+        if hasattr(Image, "Resampling"):
+            img = img.resize((8, 8), Image.Resampling.LANCZOS)
+        else:
+            img = img.resize((8, 8), Image.ANTIALIAS)
+        pixels = list(img.getdata())
+        avg = sum(pixels) // len(pixels)
+        bits = 0
+        for px in pixels:
+            bits = (bits << 1) | (1 if px > avg else 0)
+        return bits, size  # 64-bit-ish integer
+    except Exception:
+        return None, None
+
+
+class ImageHashCache:
+    """
+    On-disk cache of visual hashes keyed by (SHA-1, blob size), shared across comparisons,
+    threads and processes. Holds at most `max_entries` rows and evicts the least recently used ones.
+    """
+    TOUCH_AFTER_S = 3600  # refresh last_used at most once an hour per entry (keeps hits read-only)
+    EVICT_EVERY = 100     # puts between eviction checks
+
+    def __init__(self, path, max_entries=200_000):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.max_entries = max_entries
+        self._puts = 0
+        self._lock = threading.Lock()  # one connection, shared by comparator threads
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS image_hashes ("
+            " sha1 TEXT NOT NULL, size INTEGER NOT NULL, vhash TEXT, width INTEGER, height INTEGER,"
+            " last_used REAL NOT NULL, PRIMARY KEY (sha1, size))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS image_hashes_lru ON image_hashes (last_used)")
+
+    def get(self, sha1, size):
+        """(vhash, (w, h)) for a cached image, or None when not cached."""
+        with self._lock:
+            return self._get(sha1, size)
+
+    def put(self, sha1, size, vhash, dims):
+        with self._lock:
+            self._put(sha1, size, vhash, dims)
+
+    def _get(self, sha1, size):
+        row = self._db.execute(
+            "SELECT vhash, width, height, last_used FROM image_hashes WHERE sha1 = ? AND size = ?",
+            (sha1, size),
+        ).fetchone()
+        if row is None:
+            return None
+        vhash, width, height, last_used = row
+        now = time.time()
+        if now - last_used > self.TOUCH_AFTER_S:
+            self._db.execute(
+                "UPDATE image_hashes SET last_used = ? WHERE sha1 = ? AND size = ?", (now, sha1, size)
+            )
+        dims = (width, height) if width is not None else None
+        # stored as hex text: a 64-bit hash does not fit SQLite's signed INTEGER
+        return (int(vhash, 16) if vhash is not None else None), dims
+
+    def _put(self, sha1, size, vhash, dims):
+        width, height = dims if dims else (None, None)
+        self._db.execute(
+            "INSERT OR REPLACE INTO image_hashes VALUES (?, ?, ?, ?, ?, ?)",
+            (sha1, size, format(vhash, "x") if vhash is not None else None, width, height, time.time()),
+        )
+        self._puts += 1
+        if self._puts % self.EVICT_EVERY == 0:
+            self.evict()
+
+    def evict(self):
+        (count,) = self._db.execute("SELECT COUNT(*) FROM image_hashes").fetchone()
+        if count > self.max_entries:
+            self._db.execute(
+                "DELETE FROM image_hashes WHERE rowid IN"
+                " (SELECT rowid FROM image_hashes ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,),
+            )
 
 
-def extract_images(doc):
-    
-    images = []
-    for i, shape in enumerate(doc.inline_shapes, start=1):
+_image_hash_cache = None
+
+def cache_dir():
+    """
+    Folder for on-disk caches: WORD_COMPARATOR_CACHE_DIR, default ~/.cache/word-comparator.
+    None when the variable is set to "off".
+    """
+    folder = os.environ.get("WORD_COMPARATOR_CACHE_DIR") or os.path.join(
+        os.path.expanduser("~"), ".cache", "word-comparator"
+    )
+    return None if folder.lower() == "off" else folder
+
+_image_hash_cache_lock = threading.Lock()
+
+def get_image_hash_cache():
+    """Process-wide ImageHashCache in cache_dir(); None if caching is off or unavailable."""
+    with _image_hash_cache_lock:
+        return _open_image_hash_cache()
+
+def _open_image_hash_cache():
+    global _image_hash_cache
+    if _image_hash_cache is None:
+        folder = cache_dir()
+        if folder is None:
+            _image_hash_cache = False
+        else:
+            try:
+                _image_hash_cache = ImageHashCache(os.path.join(folder, "image_hashes.sqlite3"))
+            except Exception:
+                _image_hash_cache = False  # read-only home, locked DB, ... -> just don't cache
+    return _image_hash_cache or None
+
+
+def cached_visual_hash(sha1, blob):
+    """compute_visual_hash() through the persistent cache; repeat images skip decoding."""
+    cache = get_image_hash_cache()
+    if cache is not None:
         try:
-            width = emu_to_inches_img(shape._inline.extent.cx)
-            height = emu_to_inches_img(shape._inline.extent.cy)
-
-            # Find parent paragraph safely
-            p = shape._inline.getparent()
-            while p is not None and p.tag != qn("w:p"):
-                p = p.getparent()
-
-            para_index = None
-            if p is not None:
-                for idx, para in enumerate(doc.paragraphs, start=1):
-                    if para._p == p:
-                        para_index = idx
-                        break
-
-            images.append({
-                "id": i,
-                "width": width,
-                "height": height,
-                "para_index": para_index
-            })
+            hit = cache.get(sha1, len(blob))
+        except Exception:
+            hit = None
+        if hit is not None:
+            return hit
+    vhash, dims = compute_visual_hash(blob)
+    if cache is not None and dims is not None:
+        try:
+            cache.put(sha1, len(blob), vhash, dims)
         except Exception:
+            pass
+    return vhash, dims
+
+
+# ---- image matching ----
+IMAGE_ASSIGNMENT_LIMIT = 150  # residual side up to which pairs are assigned optimally (O(n^3))
+
+
+def hamming_distance(a, b):
+    x = a ^ b
+    return x.bit_count() if hasattr(x, "bit_count") else bin(x).count("1")
+
+
+class BKTree:
+    """Burkhard-Keller tree over integer hashes; finds every item within a Hamming radius."""
+
+    def __init__(self):
+        self.root = None  # node: [hash, items, {distance: child}]
+
+    def add(self, h, item):
+        if self.root is None:
+            self.root = [h, [item], {}]
+            return
+        node = self.root
+        while True:
+            d = hamming_distance(h, node[0])
+            if d == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [h, [item], {}]
+                return
+            node = child
+
+    def query(self, h, radius):
+        """[(distance, item)] for all items whose hash is within `radius` bits of `h`."""
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            d = hamming_distance(h, node[0])
+            if d <= radius:
+                found.extend((d, item) for item in node[1])
+            # triangle inequality: only children keyed within d±radius can hold matches
+            for cd, child in node[2].items():
+                if d - radius <= cd <= d + radius:
+                    stack.append(child)
+        return found
+
+
+def match_exact(keys_a, keys_b):
+    """Pair equal keys in document order through hash buckets; returns (pairs, leftover_a, leftover_b)."""
+    buckets = defaultdict(deque)
+    for j, key in enumerate(keys_b):
+        buckets[key].append(j)
+    pairs, left_a = [], []
+    for i, key in enumerate(keys_a):
+        bucket = buckets.get(key)
+        if bucket:
+            pairs.append((i, bucket.popleft()))
+        else:
+            left_a.append(i)
+    used_b = {j for _, j in pairs}
+    return pairs, left_a, [j for j in range(len(keys_b)) if j not in used_b]
+
+
+def _min_cost_assignment(cost):
+    """Hungarian algorithm (potentials form) for an n x m cost matrix with n <= m; returns row -> col."""
+    n, m = len(cost), len(cost[0])
+    INF = float("inf")
+    u, v = [0.0] * (n + 1), [0.0] * (m + 1)
+    owner = [0] * (m + 1)  # owner[col] = 1-based row assigned to col
+    way = [0] * (m + 1)
+    for row in range(1, n + 1):
+        owner[0] = row
+        col0 = 0
+        minv = [INF] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[col0] = True
+            r0, delta, col1 = owner[col0], INF, 0
+            crow = cost[r0 - 1]
+            for col in range(1, m + 1):
+                if not used[col]:
+                    cur = crow[col - 1] - u[r0] - v[col]
+                    if cur < minv[col]:
+                        minv[col], way[col] = cur, col0
+                    if minv[col] < delta:
+                        delta, col1 = minv[col], col
+            for col in range(m + 1):
+                if used[col]:
+                    u[owner[col]] += delta
+                    v[col] -= delta
+                else:
+                    minv[col] -= delta
+            col0 = col1
+            if owner[col0] == 0:
+                break
+        while col0:
+            col1 = way[col0]
+            owner[col0] = owner[col1]
+            col0 = col1
+    return {owner[col] - 1: col - 1 for col in range(1, m + 1) if owner[col]}
+
+
+def assign_pairs(candidates):
+    """
+    One-to-one pairs from scored candidate edges [(score, i, j)]. Small residuals get the assignment
+    with the highest total score; larger ones fall back to best-score-first greedy.
+    """
+    rows = sorted({i for _, i, _ in candidates})
+    cols = sorted({j for _, _, j in candidates})
+    if rows and max(len(rows), len(cols)) <= IMAGE_ASSIGNMENT_LIMIT:
+        transpose = len(rows) > len(cols)
+        if transpose:
+            rows, cols = cols, rows
+        row_pos = {r: k for k, r in enumerate(rows)}
+        col_pos = {c: k for k, c in enumerate(cols)}
+        cost = [[0.0] * len(cols) for _ in rows]  # non-candidates cost 0 and are dropped below
+        edges = {}
+        for s, i, j in candidates:
+            r, c = (j, i) if transpose else (i, j)
+            cost[row_pos[r]][col_pos[c]] = -s
+            edges[(r, c)] = s
+        pairs = []
+        for r, c in _min_cost_assignment(cost).items():
+            r, c = rows[r], cols[c]
+            if (r, c) in edges:
+                pairs.append((c, r) if transpose else (r, c))
+        return sorted(pairs)
+
+    pairs, used_a, used_b = [], set(), set()
+    for s, i, j in sorted(candidates, key=lambda x: (-x[0], x[1], x[2])):
+        if i in used_a or j in used_b:
             continue
-    return images
+        used_a.add(i); used_b.add(j)
+        pairs.append((i, j))
+    return pairs
 
-def compare_images(doc1, doc2, output_doc):
-    
-    import hashlib, io, math
-    from collections import defaultdict
-
-    EMU_PER_INCH_IMG = 914400
-    NS = {
-        'w':  "http://schemas.openxmlformats.org/wordprocessingml/2006/main",
-        'wp': "http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing",
-        'a':  "http://schemas.openxmlformats.org/drawingml/2006/main",
-        'pic':"http://schemas.openxmlformats.org/drawingml/2006/picture",
-        'r':  "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
-    }
+
+def compare_images(doc1, doc2, result):
 
     # thresholds (tweakable)
     VHASH_HAMMING_THRESHOLD = 10      # for 64-bit aHash (<=10 considered same-ish)
     SIZE_MATCH_TOLERANCE_IN = 0.6     # inches total tolerance (w diff + h diff)
     MIN_SIZE_FILTER_IN = 0.0          # ignore images smaller than this (both dims); 0 = keep all
 
-    def emu_to_inches_img(emu_val):
-        try:
-            return round(int(emu_val) / EMU_PER_INCH_IMG, 2)
-        except Exception:
-            return None
-
-    # compute hamming distance
-    def hamming(a, b):
-        if a is None or b is None:
-            return 999
-        x = a ^ b
-        return x.bit_count() if hasattr(x, "bit_count") else bin(x).count("1")
-
-    # Robust extractor: walks paragraph runs and finds a:blip r:embed
+    # Robust extractor: a:blip r:embed found in paragraph runs by the document model.
+    # Only the SHA-1 is taken here (shared with the "images" digest); visual hashes are filled in
+    # later for SHA leftovers.
     def extract_images_for_compare(doc):
         imgs = []
         idx = 0
-        try:
-            from PIL import Image
-            pil_ok = True
-        except Exception:
-            pil_ok = False
-            Image = None
 
-        for p_idx, para in enumerate(doc.paragraphs, start=1):
-            for run in para.runs:
-                r = getattr(run, "_r", None)
-                if r is None:
-                    continue
+        model = get_document_model(doc)
+        digests = model.image_digests or {}
+        for p_idx, rid, w_in, h_in in model.images:
+            if not rid:
+                continue
+            # optional tiny filtering
+            if (w_in is not None and h_in is not None and
+                (w_in < MIN_SIZE_FILTER_IN and h_in < MIN_SIZE_FILTER_IN)):
+                continue
 
-                # try xpath for blips (works in most python-docx versions)
-                try:
-                    blip_nodes = r.xpath('.//a:blip', namespaces=NS)
-                except Exception:
-                    # fallback: iterate and find elements ending with '}blip'
-                    blip_nodes = [el for el in r.iter() if str(el.tag).endswith('}blip')]
+            if rid in digests:
+                # snapshot: hashes were taken when the snapshot was made
+                idx += 1
+                sha1, vhash = digests[rid]
+                imgs.append({"sha1": sha1, "vhash": vhash, "hashed": True, "w": w_in, "h": h_in,
+                             "pidx": p_idx, "order_idx": idx, "rid": rid, "load_blob": None})
+                continue
 
-                if not blip_nodes:
-                    continue
+            # content hash, computed once per model
+            try:
+                sha1 = image_sha1(model, rid)
+            except Exception:
+                # relationship missing; skip
+                continue
 
-                for blip in blip_nodes:
-                    rid = blip.get('{%s}embed' % NS['r'])
-                    if not rid:
-                        continue
-                    # get part blob
-                    try:
-                        part = doc.part.related_parts[rid]
-                        blob = part.blob
-                    except Exception:
-                        # relationship missing; skip
-                        continue
-
-                    # get size if present in drawing extent (wp:extent)
-                    w_in = h_in = None
-                    try:
-                        ext_nodes = r.xpath('.//wp:extent', namespaces=NS)
-                    except Exception:
-                        ext_nodes = [el for el in r.iter() if str(el.tag).endswith('}extent')]
-                    if ext_nodes:
-                        cx = ext_nodes[0].get('cx')
-                        cy = ext_nodes[0].get('cy')
-                        w_in = emu_to_inches_img(cx) if cx else None
-                        h_in = emu_to_inches_img(cy) if cy else None
-
-                    # optional tiny filtering
-                    if (w_in is not None and h_in is not None and
-                        (w_in < MIN_SIZE_FILTER_IN and h_in < MIN_SIZE_FILTER_IN)):
-                        continue
-
-                    # content hash
-                    sha1 = hashlib.sha1(blob).hexdigest()
-
-                    # visual hash (aHash 8x8) if Pillow available
-                    vhash = None
-                    if pil_ok:
-                        try:
-                            img = Image.open(io.BytesIO(blob)).convert('L')
-                            # resize to 8x8
-                            if hasattr(Image, "Resampling"):
-                                img = img.resize((8, 8), Image.Resampling.LANCZOS)
-                            else:
-                                img = img.resize((8, 8), Image.ANTIALIAS)
-                            pixels = list(img.getdata())
-                            avg = sum(pixels) // len(pixels)
-                            bits = 0
-                            for px in pixels:
-                                bits = (bits << 1) | (1 if px > avg else 0)
-                            vhash = bits  # 64-bit-ish integer
-                        except Exception:
-                            vhash = None
-
-                    idx += 1
-                    imgs.append({
-                        "sha1": sha1,
-                        "vhash": vhash,
-                        "w": w_in,
-                        "h": h_in,
-                        "pidx": p_idx,
-                        "order_idx": idx,
-                        "blob": blob
-                    })
+            idx += 1
+            imgs.append({
+                "sha1": sha1,
+                "vhash": None,
+                "hashed": False,
+                "w": w_in,
+                "h": h_in,
+                "pidx": p_idx,
+                "order_idx": idx,
+                "rid": rid,
+                "load_blob": model.load_blob,
+            })
         return imgs
 
-    # pairing helpers
-    def greedy_match_by_key(list_a, list_b, key_fn, score_fn, threshold):
-       
-        A = list(range(len(list_a)))
-        B = list(range(len(list_b)))
-        candidates = []
-        for i in A:
-            for j in B:
-                s = score_fn(list_a[i], list_b[j])
-                if s >= threshold:
-                    candidates.append((s, i, j))
-        # sort descending by score
-        candidates.sort(reverse=True, key=lambda x: x[0])
-        usedA, usedB = set(), set()
-        pairs = []
-        for s, i, j in candidates:
-            if i in usedA or j in usedB:
+    def fill_visual_hashes(recs):
+        # aHash 8x8 if Pillow available, via the persistent cache; blobs are re-read, not kept
+        for rec in recs:
+            if rec["hashed"]:
                 continue
-            usedA.add(i); usedB.add(j)
-            pairs.append((i, j))
-        leftoverA = [i for i in A if i not in usedA]
-        leftoverB = [j for j in B if j not in usedB]
-        return pairs, leftoverA, leftoverB
+            try:
+                blob = rec["load_blob"](rec["rid"])
+            except Exception:
+                continue
+            rec["vhash"], _ = cached_visual_hash(rec["sha1"], blob)
+            rec["hashed"] = True
 
     # score functions
-    def score_sha(a, b):
-        return 1.0 if a["sha1"] == b["sha1"] else 0.0
-
     def score_vhash(a, b):
         if a["vhash"] is None or b["vhash"] is None:
             return 0.0
         # score = inverse normalized hamming distance (64 bits)
-        ham = hamming(a["vhash"], b["vhash"])
+        ham = hamming_distance(a["vhash"], b["vhash"])
         # map ham 0..64 to score 1..0
         sc = max(0.0, 1.0 - (ham / 64.0))
         return sc
@@ -1279,48 +2490,68 @@ def compare_images(doc1, doc2, output_doc):
         prox_score = max(0.0, 1.0 - min(prox, 20) / 20.0)
         return 0.6 * size_score + 0.4 * prox_score
 
+    result.section("images", "Image Comparison")
+    if parts_identical(doc1, doc2, "images"):
+        return
+
     # run extraction
     imgs1 = extract_images_for_compare(doc1)
     imgs2 = extract_images_for_compare(doc2)
 
-    output_doc.add_heading("Image Comparison", level=1)
-
-    # 1) exact sha matches (score 1.0)
-    pairs_sha, rem1, rem2 = greedy_match_by_key(imgs1, imgs2, lambda x: x["sha1"], lambda a,b: 1.0 if a["sha1"] == b["sha1"] else 0.0, 1.0)
-
-    matched_a = set(i for i,_ in pairs_sha)
-    matched_b = set(j for _,j in pairs_sha)
-    final_pairs = list(pairs_sha)
-
-    # 2) visual hash matching for leftovers if Pillow available
-    leftovers1 = [imgs1[i] for i in range(len(imgs1)) if i not in matched_a]
-    leftovers2 = [imgs2[j] for j in range(len(imgs2)) if j not in matched_b]
-    if leftovers1 and leftovers2:
-        pairs_v, la, lb = greedy_match_by_key(leftovers1, leftovers2, None, score_vhash, 1.0 - (VHASH_HAMMING_THRESHOLD / 64.0))
-        # map back to original indices
-        # leftovers1[i] corresponds to original index idx1 where imgs1[idx1] == leftovers1[i]
-        idx_map1 = [i for i in range(len(imgs1)) if i not in matched_a]
-        idx_map2 = [j for j in range(len(imgs2)) if j not in matched_b]
-        for i_local, j_local in pairs_v:
-            i_orig = idx_map1[i_local]
-            j_orig = idx_map2[j_local]
-            final_pairs.append((i_orig, j_orig))
-            matched_a.add(i_orig); matched_b.add(j_orig)
+    def image_value(rec):
+        return {"width": rec.get("w"), "height": rec.get("h"), "paragraph": rec.get("pidx"), "sha1": rec["sha1"]}
+
+    # 1) exact sha matches: hash buckets, first unused occurrence in document order
+    final_pairs, rem1, rem2 = match_exact([im["sha1"] for im in imgs1], [im["sha1"] for im in imgs2])
+    matched_a = set(i for i,_ in final_pairs)
+    matched_b = set(j for _,j in final_pairs)
+
+    # 2) visual hash matching for leftovers if Pillow available (BK-tree radius query)
+    if rem1 and rem2:
+        fill_visual_hashes([imgs1[i] for i in rem1])
+        fill_visual_hashes([imgs2[j] for j in rem2])
+        tree = BKTree()
+        for j in rem2:
+            if imgs2[j]["vhash"] is not None:
+                tree.add(imgs2[j]["vhash"], j)
+        candidates = []
+        for i in rem1:
+            if imgs1[i]["vhash"] is None:
+                continue
+            for ham, j in tree.query(imgs1[i]["vhash"], VHASH_HAMMING_THRESHOLD):
+                candidates.append((1.0 - ham / 64.0, i, j))
+        for i, j in assign_pairs(candidates):
+            final_pairs.append((i, j))
+            matched_a.add(i); matched_b.add(j)
 
     # 3) size+proximity match for remaining
-    leftovers1 = [i for i in range(len(imgs1)) if i not in matched_a]
-    leftovers2 = [j for j in range(len(imgs2)) if j not in matched_b]
+    leftovers1 = [i for i in rem1 if i not in matched_a]
+    leftovers2 = [j for j in rem2 if j not in matched_b]
     if leftovers1 and leftovers2:
-        listA = [imgs1[i] for i in leftovers1]
-        listB = [imgs2[j] for j in leftovers2]
-        # use score_size_and_proximity, threshold low
-        pairs_s, la, lb = greedy_match_by_key(listA, listB, None, score_size_and_proximity, 0.25)
-        # map back indices
-        for i_local, j_local in pairs_s:
-            i_orig = leftovers1[i_local]
-            j_orig = leftovers2[j_local]
-            final_pairs.append((i_orig, j_orig))
-            matched_a.add(i_orig); matched_b.add(j_orig)
+        # score >= 0.25 needs paragraphs < 20 apart or a size difference <= 0.35in (0.6*size >= 0.25),
+        # so candidates come from a paragraph-sorted window plus a coarse size grid
+        by_para = sorted((imgs2[j].get("pidx") or 0, j) for j in leftovers2)
+        para_keys = [p for p, _ in by_para]
+        cell = SIZE_MATCH_TOLERANCE_IN
+        grid = defaultdict(list)
+        for j in leftovers2:
+            grid[(int((imgs2[j].get("w") or 0) // cell), int((imgs2[j].get("h") or 0) // cell))].append(j)
+        candidates = []
+        for i in leftovers1:
+            a = imgs1[i]
+            pa = a.get("pidx") or 0
+            near = {j for _, j in by_para[bisect_left(para_keys, pa - 19):bisect_right(para_keys, pa + 19)]}
+            gw, gh = int((a.get("w") or 0) // cell), int((a.get("h") or 0) // cell)
+            for dw in (-1, 0, 1):
+                for dh in (-1, 0, 1):
+                    near.update(grid.get((gw + dw, gh + dh), ()))
+            for j in near:
+                s = score_size_and_proximity(a, imgs2[j])
+                if s >= 0.25:
+                    candidates.append((s, i, j))
+        for i, j in assign_pairs(candidates):
+            final_pairs.append((i, j))
+            matched_a.add(i); matched_b.add(j)
 
     # Now produce reports
     used_pairs = set()
@@ -1333,29 +2564,28 @@ def compare_images(doc1, doc2, output_doc):
         size_changed = (a.get("w") != b.get("w") or a.get("h") != b.get("h"))
 
         if size_changed and not moved:
-            add_colored_paragraph(
-                output_doc,
+            kind, line = "modified", colored_line(
                 f"[Image Modified] Image {counter}",
                 f"Old: Size={a.get('w')}in × {a.get('h')}in\nNew: Size={b.get('w')}in × {b.get('h')}in",
-                (0, 0, 255)
+                BLUE
             )
         elif moved and not size_changed:
-            add_colored_paragraph(
-                output_doc,
+            kind, line = "moved", colored_line(
                 f"[Image Moved] Image {counter}",
                 f"Size: {b.get('w')}in × {b.get('h')}in\nOld position: Paragraph {a.get('pidx')} → New position: Paragraph {b.get('pidx')}",
-                (255, 165, 0)
+                ORANGE
             )
         elif moved and size_changed:
-            add_colored_paragraph(
-                output_doc,
+            kind, line = "modified", colored_line(
                 f"[Image Modified] Image {counter}",
                 f"Old: Size={a.get('w')}in × {a.get('h')}in\nNew: Size={b.get('w')}in × {b.get('h')}in\nOld position: Paragraph {a.get('pidx')} → New: Paragraph {b.get('pidx')}",
-                (0, 0, 255)
+                BLUE
             )
         else:
             # exact same content and size/position -> nothing to report
-            pass
+            kind = None
+        if kind:
+            result.add(kind, {"image": counter}, image_value(a), image_value(b), None, [line])
 
         used_pairs.add((ia, jb))
         counter += 1
@@ -1364,24 +2594,22 @@ def compare_images(doc1, doc2, output_doc):
     for i, rec in enumerate(imgs1):
         if i in matched_a:
             continue
-        add_colored_paragraph(
-            output_doc,
+        result.add("removed", {"image": counter}, image_value(rec), None, None, [colored_line(
             f"[Image Removed] Image {counter}",
             f"Size: {rec.get('w')}in × {rec.get('h')}in\nOld position: Paragraph {rec.get('pidx')}",
-            (255, 0, 0)
-        )
+            RED
+        )])
         counter += 1
 
     # Added (present in doc2 but not matched)
     for j, rec in enumerate(imgs2):
         if j in matched_b:
             continue
-        add_colored_paragraph(
-            output_doc,
+        result.add("added", {"image": counter}, None, image_value(rec), None, [colored_line(
             f"[Image Added] Image {counter}",
             f"Size: {rec.get('w')}in × {rec.get('h')}in\nPosition: Paragraph {rec.get('pidx')}",
-            (0, 128, 0)
-        )
+            GREEN
+        )])
         counter += 1
 
 
@@ -1393,43 +2621,20 @@ def emu_to_inches(emu):
 
 def extract_shapes_from_doc(doc):
     shapes = []
-    package = doc._part.package
-    document_part = package.part_related_by(
-        "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
-    )
-    xml_content = document_part.blob
-    tree = ET.fromstring(xml_content)
-
-    ns = {
-        'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main',
-        'wp': 'http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing',
-        'a': 'http://schemas.openxmlformats.org/drawingml/2006/main',
-        'pic': 'http://schemas.openxmlformats.org/drawingml/2006/picture',
-        'wps': 'http://schemas.microsoft.com/office/word/2010/wordprocessingShape'
-    }
 
-    for drawing in tree.findall(".//w:drawing", ns):
+    # kind is "picture", "textbox" or the preset geometry name (see _drawing_rec)
+    for para_index, kind, width, height in get_document_model(doc).drawings:
         # 🚫 Skip if it's an image
-        if drawing.find(".//pic:pic", ns) is not None:
+        if kind == "picture":
             continue
-
-        extent = drawing.find(".//wp:extent", ns)
-        if extent is None:
+        if width is None:
             continue
-        cx = int(extent.attrib.get('cx', 0))
-        cy = int(extent.attrib.get('cy', 0))
-
-        # ✅ Distinguish textbox vs real shape
-        if drawing.find(".//wps:txbx", ns) is not None:
-            shape_type = "textbox"
-        else:
-            prstGeom = drawing.find(".//a:prstGeom", ns)
-            shape_type = prstGeom.attrib.get('prst') if prstGeom is not None else "unknown"
 
         shapes.append({
-            "type": shape_type,
-            "width": round(cx / EMU_PER_INCH, 2),
-            "height": round(cy / EMU_PER_INCH, 2)
+            "type": kind,
+            "width": width,
+            "height": height,
+            "para_index": para_index
         })
 
     return shapes
@@ -1441,10 +2646,121 @@ def shape_distance(s1, s2):
     size_score = math.sqrt((s1['width'] - s2['width'])**2 + (s1['height'] - s2['height'])**2)
     return type_score * 5 + size_score
 
-def compare_shapes(doc1, doc2, output_doc):
+
+# ---- shape alignment ----
+# Needleman-Wunsch restricted to a diagonal band that doubles until the result is provably
+# optimal; cost rows and backtrace codes (one bytearray per row) only span the band. Beyond
+# SHAPE_DP_CELL_LIMIT band cells the alignment switches to Hirschberg's linear-space divide and conquer.
+SHAPE_BAND_START = 16
+SHAPE_DP_CELL_LIMIT = 4_000_000
+_MATCH, _REM, _ADD = 0, 1, 2
+
+
+def _banded_alignment(a, b, lo, hi, match_cost, rem_cost, add_cost):
+    """NW over cells with lo <= j - i <= hi (lo <= 0 <= hi); returns (cost, [(op, i, j)]) with local indices.
+
+    Rows only hold the band: cell (i, j) lives at offset j - i - lo, so the cell above (i - 1, j) is
+    one offset further right and the diagonal (i - 1, j - 1) sits at the same offset.
+    """
+    INF = float("inf")
+    n, m = len(a), len(b)
+    width = hi - lo + 1
+    prev = [INF] * (width + 1)  # one spare slot past the band reads as INF
+    prev[-lo] = 0.0
+    bt = [bytearray(width)]
+    for j in range(1, min(m, hi) + 1):
+        prev[j - lo] = prev[j - 1 - lo] + add_cost
+        bt[0][j - lo] = _ADD
+    for i in range(1, n + 1):
+        cur = [INF] * (width + 1)
+        row = bytearray(width)
+        j_lo, j_hi = max(0, i + lo), min(m, i + hi)
+        if j_lo == 0:
+            cur[-i - lo] = prev[-i - lo + 1] + rem_cost
+            row[-i - lo] = _REM
+            j_lo = 1
+        ai = a[i - 1]
+        for j in range(j_lo, j_hi + 1):
+            d = j - i - lo
+            c_match = prev[d] + match_cost(ai, b[j - 1])
+            c_rem = prev[d + 1] + rem_cost
+            c_add = cur[d - 1] + add_cost if d else INF
+            if c_match <= c_rem and c_match <= c_add:
+                cur[d] = c_match
+                row[d] = _MATCH
+            elif c_rem <= c_add:
+                cur[d] = c_rem
+                row[d] = _REM
+            else:
+                cur[d] = c_add
+                row[d] = _ADD
+        bt.append(row)
+        prev = cur
+
+    actions = []
+    i, j = n, m
+    while i > 0 or j > 0:
+        op = bt[i][j - i - lo]
+        if op == _MATCH:
+            i -= 1; j -= 1
+            actions.append(('MATCH', i, j))
+        elif op == _REM:
+            i -= 1
+            actions.append(('REM', i, None))
+        else:
+            j -= 1
+            actions.append(('ADD', None, j))
+    actions.reverse()
+    return prev[m - n - lo], actions
+
+
+def _last_row_costs(a, b, match_cost, rem_cost, add_cost):
+    """Final NW cost row of a against every prefix of b, in O(len(b)) memory."""
+    prev = [j * add_cost for j in range(len(b) + 1)]
+    for ai in a:
+        cur = [prev[0] + rem_cost]
+        for j, bj in enumerate(b, start=1):
+            cur.append(min(prev[j - 1] + match_cost(ai, bj), prev[j] + rem_cost, cur[j - 1] + add_cost))
+        prev = cur
+    return prev
+
+
+def _hirschberg(a, b, match_cost, rem_cost, add_cost):
+    n, m = len(a), len(b)
+    if n <= 1 or (n + 1) * (m + 1) <= SHAPE_DP_CELL_LIMIT:
+        return _banded_alignment(a, b, -n, m, match_cost, rem_cost, add_cost)[1]
+    mid = n // 2
+    fwd = _last_row_costs(a[:mid], b, match_cost, rem_cost, add_cost)
+    bwd = _last_row_costs(a[mid:][::-1], b[::-1], match_cost, rem_cost, add_cost)
+    split = min(range(m + 1), key=lambda j: fwd[j] + bwd[m - j])
+    head = _hirschberg(a[:mid], b[:split], match_cost, rem_cost, add_cost)
+    tail = _hirschberg(a[mid:], b[split:], match_cost, rem_cost, add_cost)
+    return head + [
+        (op, None if i is None else i + mid, None if j is None else j + split) for op, i, j in tail
+    ]
+
+
+def align_shapes(a, b, match_cost, rem_cost, add_cost):
+    """Minimum-cost alignment of two shape lists as [('MATCH'|'REM'|'ADD', i, j)] in document order."""
+    n, m = len(a), len(b)
+    gap = min(rem_cost, add_cost)
+    k = SHAPE_BAND_START
+    while True:
+        lo, hi = min(0, m - n) - k, max(0, m - n) + k
+        full = lo <= -n and hi >= m
+        if full:
+            lo, hi = -n, m
+        if (n + 1) * (hi - lo + 1) > SHAPE_DP_CELL_LIMIT:
+            return _hirschberg(a, b, match_cost, rem_cost, add_cost)
+        cost, actions = _banded_alignment(a, b, lo, hi, match_cost, rem_cost, add_cost)
+        # a path leaving the band needs at least 2*(k+1) + |m-n| gaps, so cheaper results are optimal
+        if full or cost <= gap * (2 * (k + 1) + abs(m - n)):
+            return actions
+        k *= 2
+
+def compare_shapes(doc1, doc2, result):
    
     import math
-    from docx.shared import RGBColor
 
     def size_dist(a, b):
         return math.hypot(a['width'] - b['width'], a['height'] - b['height'])
@@ -1453,7 +2769,9 @@ def compare_shapes(doc1, doc2, output_doc):
     shapes1 = extract_shapes_from_doc(doc1)  # expects dicts: {'type','width','height'}
     shapes2 = extract_shapes_from_doc(doc2)
 
-    output_doc.add_heading("Shape Comparison", level=1)
+    result.section("shapes", "Shape Comparison")
+    if parts_identical(doc1, doc2, "shapes"):
+        return
 
     n, m = len(shapes1), len(shapes2)
     if n == 0 and m == 0:
@@ -1469,49 +2787,8 @@ def compare_shapes(doc1, doc2, output_doc):
             return BIG  # never force different types to match
         return size_dist(s1, s2)
 
-    # --- DP (Needleman–Wunsch style) ---
-    dp = [[0.0] * (m + 1) for _ in range(n + 1)]
-    bt = [[None] * (m + 1) for _ in range(n + 1)]  # backtrace
-
-    # init
-    for i in range(1, n + 1):
-        dp[i][0] = dp[i - 1][0] + REM_COST
-        bt[i][0] = ('REM', i - 1, None)
-    for j in range(1, m + 1):
-        dp[0][j] = dp[0][j - 1] + ADD_COST
-        bt[0][j] = ('ADD', None, j - 1)
-
-    # fill
-    for i in range(1, n + 1):
-        for j in range(1, m + 1):
-            c_match = dp[i - 1][j - 1] + match_cost(shapes1[i - 1], shapes2[j - 1])
-            c_rem   = dp[i - 1][j] + REM_COST
-            c_add   = dp[i][j - 1] + ADD_COST
-
-            # pick min
-            if c_match <= c_rem and c_match <= c_add:
-                dp[i][j] = c_match
-                bt[i][j] = ('MATCH', i - 1, j - 1)
-            elif c_rem <= c_add:
-                dp[i][j] = c_rem
-                bt[i][j] = ('REM', i - 1, None)
-            else:
-                dp[i][j] = c_add
-                bt[i][j] = ('ADD', None, j - 1)
-
-    # backtrack to actions in forward order
-    actions = []
-    i, j = n, m
-    while i > 0 or j > 0:
-        op, oi, oj = bt[i][j]
-        actions.append((op, oi, oj))
-        if op == 'MATCH':
-            i -= 1; j -= 1
-        elif op == 'REM':
-            i -= 1
-        else:  # 'ADD'
-            j -= 1
-    actions.reverse()
+    # --- banded DP (Needleman–Wunsch style), see align_shapes ---
+    actions = align_shapes(shapes1, shapes2, match_cost, REM_COST, ADD_COST)
 
     # --- emit results (suppress tiny noise) ---
     EPS = 0.05  # ~0.05 inch = ignore tiny differences
@@ -1523,49 +2800,64 @@ def compare_shapes(doc1, doc2, output_doc):
             s2 = shapes2[oj]
             # same type guaranteed by match_cost
             if size_dist(s1, s2) > EPS:
-                p = output_doc.add_paragraph(f"[Shape Modified] Shape {shape_counter}")
-                p.runs[0].font.color.rgb = RGBColor(0, 0, 255)
-                output_doc.add_paragraph(f"Old: Type={s1['type']}, W={s1['width']}in, H={s1['height']}in")
-                output_doc.add_paragraph(f"New: Type={s2['type']}, W={s2['width']}in, H={s2['height']}in")
+                result.add("modified", {"shape": shape_counter}, s1, s2, None, [
+                    text_line(f"[Shape Modified] Shape {shape_counter}", BLUE),
+                    text_line(f"Old: Type={s1['type']}, W={s1['width']}in, H={s1['height']}in"),
+                    text_line(f"New: Type={s2['type']}, W={s2['width']}in, H={s2['height']}in"),
+                ])
             # else identical enough → no line
             shape_counter += 1
 
         elif op == 'REM':
             s1 = shapes1[oi]
-            p = output_doc.add_paragraph(f"[Shape Removed] Shape {shape_counter}")
-            p.runs[0].font.color.rgb = RGBColor(255, 0, 0)
-            output_doc.add_paragraph(f"Old: Type={s1['type']}, W={s1['width']}in, H={s1['height']}in")
-            output_doc.add_paragraph("New: None")
+            result.add("removed", {"shape": shape_counter}, s1, None, None, [
+                text_line(f"[Shape Removed] Shape {shape_counter}", RED),
+                text_line(f"Old: Type={s1['type']}, W={s1['width']}in, H={s1['height']}in"),
+                text_line("New: None"),
+            ])
             shape_counter += 1
 
         elif op == 'ADD':
             s2 = shapes2[oj]
-            p = output_doc.add_paragraph(f"[Shape Added] Shape {shape_counter}")
-            p.runs[0].font.color.rgb = RGBColor(0, 128, 0)
-            output_doc.add_paragraph("Old: None")
-            output_doc.add_paragraph(f"New: Type={s2['type']}, W={s2['width']}in, H={s2['height']}in")
+            result.add("added", {"shape": shape_counter}, None, s2, None, [
+                text_line(f"[Shape Added] Shape {shape_counter}", GREEN),
+                text_line("Old: None"),
+                text_line(f"New: Type={s2['type']}, W={s2['width']}in, H={s2['height']}in"),
+            ])
             shape_counter += 1
         
 #================================ Page Break Comparison ========================================
 
 def extract_page_break_positions(doc):
-    
-    page_breaks = []
-    for i, para in enumerate(doc.paragraphs):
-        for run in para.runs:
-            # Look for <w:br w:type="page"/> in the run XML
-            for br in run._element.findall(".//w:br", run._element.nsmap):
-                if br.get(qn("w:type")) == "page":
-                    preview = para.text.strip()[:80]
-                    page_breaks.append((i + 1, preview))
-    return page_breaks
+    # <w:br w:type="page"/> inside the paragraph runs, collected by the document model
+    return [(br.para_index, br.preview) for br in get_document_model(doc).breaks]
 
 
-def compare_page_breaks(doc1, doc2, output_doc):
-    output_doc.add_heading("Page Break Comparison", level=1)
+def compare_page_breaks(doc1, doc2, result):
+    result.section("page_breaks", "Page Break Comparison")
+    if parts_identical(doc1, doc2, "page_breaks"):
+        result.note("No page break differences found ✅")
+        return
 
     pb1 = extract_page_break_positions(doc1)
     pb2 = extract_page_break_positions(doc2)
+    pages1 = get_document_model(doc1).pages.paragraphs
+    pages2 = get_document_model(doc2).pages.paragraphs
+
+    def page_of(pages, para_index):
+        return pages[para_index - 1] if 0 < para_index <= len(pages) else 1
+
+    def removed(p1, prev1):
+        page = page_of(pages1, p1)
+        result.add("removed", {"old_paragraph": p1, "old_page": page}, prev1, None, None, [
+            text_line(f"[Removed PAGE_BREAK] after Paragraph {p1} | Page {page} | Preview: \"{prev1}\"", RED),
+        ])
+
+    def added(p2, prev2):
+        page = page_of(pages2, p2)
+        result.add("added", {"paragraph": p2, "page": page}, None, prev2, None, [
+            text_line(f"[Added PAGE_BREAK] after Paragraph {p2} | Page {page} | Preview: \"{prev2}\"", GREEN),
+        ])
 
     i, j = 0, 0
     changes_found = False
@@ -1578,61 +2870,45 @@ def compare_page_breaks(doc1, doc2, output_doc):
             p1, prev1 = pb1[i]
             p2, prev2 = pb2[j]
             if p1 < p2:
-                p = output_doc.add_paragraph(
-                    f"[Removed PAGE_BREAK] after Paragraph {p1} | Preview: \"{prev1}\""
-                )
-                p.runs[0].font.color.rgb = RGBColor(255, 0, 0)
+                removed(p1, prev1)
                 i += 1
                 changes_found = True
             elif p2 < p1:
-                p = output_doc.add_paragraph(
-                    f"[Added PAGE_BREAK] after Paragraph {p2} | Preview: \"{prev2}\""
-                )
-                p.runs[0].font.color.rgb = RGBColor(0, 128, 0)
+                added(p2, prev2)
                 j += 1
                 changes_found = True
             else:
-                p = output_doc.add_paragraph(
-                    f"[Modified PAGE_BREAK] Paragraph {p1}"
-                )
-                p.runs[0].font.color.rgb = RGBColor(0, 0, 255)
+                result.add("modified", {"paragraph": p1, "page": page_of(pages2, p2)}, prev1, prev2, None, [
+                    text_line(f"[Modified PAGE_BREAK] Paragraph {p1} | Page {page_of(pages2, p2)}", BLUE),
+                ])
                 i += 1
                 j += 1
                 changes_found = True
 
     # Remaining removals
     while i < len(pb1):
-        p1, prev1 = pb1[i]
-        p = output_doc.add_paragraph(
-            f"[Removed PAGE_BREAK] after Paragraph {p1} | Preview: \"{prev1}\""
-        )
-        p.runs[0].font.color.rgb = RGBColor(255, 0, 0)
+        removed(*pb1[i])
         i += 1
         changes_found = True
 
     # Remaining additions
     while j < len(pb2):
-        p2, prev2 = pb2[j]
-        p = output_doc.add_paragraph(
-            f"[Added PAGE_BREAK] after Paragraph {p2} | Preview: \"{prev2}\""
-        )
-        p.runs[0].font.color.rgb = RGBColor(0, 128, 0)
+        added(*pb2[j])
         j += 1
         changes_found = True
 
     if not changes_found:
-        output_doc.add_paragraph("No page break differences found ✅")
+        result.note("No page break differences found ✅")
 
 #===================================== Moved paragraph comparison ==================================
 
-from collections import defaultdict
 
 def group_paragraphs(doc, block_size=1):
     """Group paragraphs into blocks (default 1 para per block)."""
     blocks = []
     buf = []
-    for p in doc.paragraphs:
-        txt = p.text.strip()
+    for p in get_document_model(doc).paragraphs:
+        txt = p.text
         if txt:
             buf.append(txt)
             if len(buf) >= block_size:
@@ -1642,49 +2918,478 @@ def group_paragraphs(doc, block_size=1):
         blocks.append("\n".join(buf))
     return blocks
 
-def compare_moved_paragraphs(doc1, doc2, output_doc):
-    output_doc.add_heading("Moved Paragraphs Comparison", level=1)
+# ---- moved block detection ----
+# Paragraph texts are interned to ids and aligned; paragraphs left over on both sides that share
+# an id seed a moved block, which is then grown in both directions over consecutive leftovers that
+# are identical or still MOVE_EDIT_RATIO similar (moved-then-edited paragraphs).
+MOVE_EDIT_RATIO = 0.8
+MOVE_SEED_CANDIDATES = 8  # new positions tried per seed when a paragraph text repeats
+
+def detect_moved_blocks(texts1, texts2):
+    """Moved runs of paragraphs as [(i1, i2, j1, j2, edited)]: half-open ranges, edited pair count."""
+    vocab = {}
+    ids1, ids2 = intern_tokens(texts1, vocab), intern_tokens(texts2, vocab)
+    n1, n2 = len(ids1), len(ids2)
+    free1, free2 = [True] * n1, [True] * n2
+    for tag, i1, i2, j1, j2 in align_sequences(ids1, ids2):
+        if tag == "equal":
+            free1[i1:i2] = [False] * (i2 - i1)
+            free2[j1:j2] = [False] * (j2 - j1)
+
+    where2 = defaultdict(deque)
+    for j, t in enumerate(ids2):
+        if free2[j]:
+            where2[t].append(j)
+
+    def same(i, j):
+        if ids1[i] == ids2[j]:
+            return True, False
+        sm = SequenceMatcher(None, texts1[i], texts2[j])
+        ok = sm.real_quick_ratio() >= MOVE_EDIT_RATIO and sm.quick_ratio() >= MOVE_EDIT_RATIO \
+            and sm.ratio() >= MOVE_EDIT_RATIO
+        return ok, ok
+
+    def grow(i, j):
+        # -> (start offset <= 0, end offset > 0, edited pairs)
+        lo, hi, edited = 0, 1, 0
+        while i + hi < n1 and j + hi < n2 and free1[i + hi] and free2[j + hi]:
+            ok, was_edited = same(i + hi, j + hi)
+            if not ok:
+                break
+            hi += 1
+            edited += was_edited
+        while i + lo > 0 and j + lo > 0 and free1[i + lo - 1] and free2[j + lo - 1]:
+            ok, was_edited = same(i + lo - 1, j + lo - 1)
+            if not ok:
+                break
+            lo -= 1
+            edited += was_edited
+        return lo, hi, edited
+
+    moves = []
+    for i in range(n1):
+        if not free1[i]:
+            continue
+        cands = where2.get(ids1[i])
+        while cands and not free2[cands[0]]:
+            cands.popleft()
+        if not cands:
+            continue
+        best = None
+        for j in [j for j in list(cands)[:MOVE_SEED_CANDIDATES] if free2[j]]:
+            lo, hi, edited = grow(i, j)
+            if best is None or hi - lo > best[1] - best[0]:
+                best = (lo, hi, edited, j)
+        lo, hi, edited, j = best
+        free1[i + lo:i + hi] = [False] * (hi - lo)
+        free2[j + lo:j + hi] = [False] * (hi - lo)
+        moves.append((i + lo, i + hi, j + lo, j + hi, edited))
+    moves.sort()
+    return moves
+
+def compare_moved_paragraphs(doc1, doc2, result):
+    result.section("moved_paragraphs", "Moved Paragraphs Comparison")
+    if parts_identical(doc1, doc2, "texts"):
+        result.note("No moved paragraphs found ✅")
+        return
 
     blocks1 = group_paragraphs(doc1, block_size=1)
     blocks2 = group_paragraphs(doc2, block_size=1)
 
-    pos1 = defaultdict(list)
-    pos2 = defaultdict(list)
-
-    for i, b in enumerate(blocks1):
-        pos1[b].append(i)
-    for j, b in enumerate(blocks2):
-        pos2[b].append(j)
-
     found = False
-    reported = set()  # to avoid duplicates
+    for i1, i2, j1, j2, edited in detect_moved_blocks(blocks1, blocks2):
+        found = True
+        preview = blocks1[i1][:120].replace("\n", " / ")
+        if i2 - i1 == 1:
+            heading = f"[Paragraph Block Moved] \"{preview}\""
+            position = f"Old position: Block {i1+1} → New position: Block {j1+1}"
+        else:
+            heading = f"[Paragraph Block Moved] \"{preview}\" (+{i2 - i1 - 1} more paragraphs)"
+            position = f"Old position: Blocks {i1+1}–{i2} → New position: Blocks {j1+1}–{j2}"
+        lines = [heading_line(heading), text_line(position)]
+        if edited:
+            lines.append(text_line(f"[Edited While Moved] {edited} of {i2 - i1} paragraphs changed", ORANGE))
+        result.add(
+            "moved",
+            {"old_block": i1 + 1, "old_blocks": i2 - i1, "block": j1 + 1, "blocks": j2 - j1, "edited": edited},
+            "\n".join(blocks1[i1:i2]), "\n".join(blocks2[j1:j2]), None, lines,
+        )
 
-    for text in set(pos1.keys()).intersection(pos2.keys()):
-        # only check the first occurrence for simplicity
-        idx1 = pos1[text][0]
-        idx2 = pos2[text][0]
+    if not found:
+        result.note("No moved paragraphs found ✅")
+
+# ====================== Model Snapshots ================================
+# A snapshot is a data-only DocumentModel: paragraph proxies become ParaStyles (table cells already
+# are fingerprint tuples) and images are reduced to their hashes. Snapshots are stored as gzipped
+# JSON under cache_dir()/snapshots keyed by the SHA-256 of the file, so comparing one PRE document
+# against successive POST versions extracts the PRE side only once. The folder is kept under
+# SNAPSHOT_MAX_BYTES by deleting the least recently used snapshots.
+SNAPSHOT_VERSION = 10  # bump when the model records or fingerprints change shape
+SNAPSHOT_MAX_BYTES = 512 * 1024 * 1024
+# the only record types a snapshot file may contain; anything else is rejected on load
+_SNAPSHOT_RECORDS = {
+    cls.__name__: cls
+    for cls in (
+        DocumentModel, ParagraphRec, TableRec, DrawingRec, ImageRec, BreakRec, TextboxRec,
+        SectionRec, PageIndex, ParaStyle,
+    )
+}
+
+def snapshot_model(doc):
+    model = get_document_model(doc)
+    if model.doc is None and model.image_digests is not None:
+        return model  # already a snapshot
+    paragraphs = tuple(p._replace(para=para_style(p.para, model.styles)) for p in model.paragraphs)
+    textboxes = tuple(
+        tb._replace(paras=None if tb.paras is None else [para_style(p, model.styles) for p in tb.paras])
+        for tb in model.textboxes
+    )
+    digests = {}
+    for rec in model.images:
+        if rec.rid and rec.rid not in digests:
+            try:
+                blob = model.load_blob(rec.rid)
+            except Exception:
+                continue
+            sha1 = hashlib.sha1(blob).hexdigest()
+            digests[rec.rid] = (sha1, cached_visual_hash(sha1, blob)[0])
+    return model._replace(
+        doc=None, paragraphs=paragraphs, textboxes=textboxes,
+        load_blob=_snapshot_blob, styles={}, image_digests=digests,
+    )
 
-        if idx1 != idx2:
-            key = (text, min(idx1, idx2), max(idx1, idx2))
-            if key in reported:
+def _snapshot_blob(rid):
+    raise KeyError(f"{rid}: snapshots keep image hashes, not image data")
+
+def _snapshot_encode(obj, shared):
+    """JSON-ready form of a snapshot: tuples are arrays, everything else is tagged.
+
+    Longer byte strings (the run property XML in format keys) are written once and referenced after.
+    """
+    if obj is None or isinstance(obj, (str, bool, int, float)):
+        return obj
+    if isinstance(obj, tuple):
+        if type(obj).__name__ in _SNAPSHOT_RECORDS:
+            return {"n": type(obj).__name__, "v": [_snapshot_encode(x, shared) for x in obj]}
+        return [_snapshot_encode(x, shared) for x in obj]
+    if isinstance(obj, list):
+        return {"l": [_snapshot_encode(x, shared) for x in obj]}
+    if isinstance(obj, dict):
+        return {"d": [[_snapshot_encode(k, shared), _snapshot_encode(v, shared)] for k, v in obj.items()]}
+    if isinstance(obj, bytes):
+        if len(obj) < 32:
+            return {"b": obj.hex()}
+        if obj in shared:
+            return {"r": shared[obj]}
+        shared[obj] = len(shared)
+        return {"s": obj.hex()}
+    if obj is _snapshot_blob:
+        return {"f": "blob"}
+    raise TypeError(f"cannot store {type(obj).__name__} in a snapshot")
+
+def _snapshot_decode(obj, shared):
+    if isinstance(obj, list):
+        return tuple(_snapshot_decode(x, shared) for x in obj)
+    if not isinstance(obj, dict):
+        return obj
+    if "n" in obj:
+        return _SNAPSHOT_RECORDS[obj["n"]](*(_snapshot_decode(x, shared) for x in obj["v"]))
+    if "l" in obj:
+        return [_snapshot_decode(x, shared) for x in obj["l"]]
+    if "d" in obj:
+        return {_snapshot_decode(k, shared): _snapshot_decode(v, shared) for k, v in obj["d"]}
+    if "b" in obj:
+        return bytes.fromhex(obj["b"])
+    if "s" in obj:
+        shared.append(bytes.fromhex(obj["s"]))
+        return shared[-1]
+    if "r" in obj:
+        return shared[obj["r"]]
+    if obj.get("f") == "blob":
+        return _snapshot_blob
+    raise ValueError(f"unknown snapshot entry {sorted(obj)}")
+
+def evict_snapshots(folder, max_bytes=SNAPSHOT_MAX_BYTES):
+    """Delete the least recently used snapshots in `folder` until the rest fit in `max_bytes`."""
+    entries = []
+    for name in os.listdir(folder):
+        if not name.endswith(".tmp"):  # older-format snapshots are never read again and age out first
+            try:
+                st = os.stat(os.path.join(folder, name))
+            except OSError:
                 continue
-            reported.add(key)
+            entries.append((st.st_mtime, st.st_size, name))
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(folder, name))
+        except OSError:
+            pass
+        total -= size
+
+def load_snapshot_model(source, streaming=False):
+    """Snapshot of `source` (path or file object), read from the snapshot store when present."""
+    if hasattr(source, "read"):
+        if hasattr(source, "seek"):
+            source.seek(0)
+        data = source.read()
+    else:
+        with open(source, "rb") as fh:
+            data = fh.read()
+    digest = hashlib.sha256(data).hexdigest()
+    folder = cache_dir()
+    path = None
+    if folder is not None:
+        name = f"{digest}-v{SNAPSHOT_VERSION}{'-stream' if streaming else ''}.json.gz"
+        path = os.path.join(folder, "snapshots", name)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as fh:
+                model = _snapshot_decode(json.load(fh), [])
+            os.utime(path)  # mtime = last use, for evict_snapshots
+            return model
+        except Exception:
+            pass  # missing or unreadable -> rebuild
 
-            found = True
-            preview = text[:120].replace("\n", " / ")
-            output_doc.add_paragraph(
-                f"[Paragraph Block Moved] \"{preview}\"",
-                style="Heading 3"
-            )
-            output_doc.add_paragraph(
-                f"Old position: Block {idx1+1} → New position: Block {idx2+1}"
-            )
+    model = snapshot_model(load_document_model(BytesIO(data), streaming=streaming))
+    if path is not None:
+        tmp = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # a unique temp file per writer, renamed into place: concurrent writers (threads or
+            # processes) never interleave, and readers never see half a file
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8", compresslevel=1) as fh:
+                json.dump(_snapshot_encode(model, {}), fh, separators=(",", ":"))
+            os.replace(tmp, path)
+            tmp = None
+            evict_snapshots(os.path.dirname(path))
+        except Exception:
+            pass
+        finally:
+            if tmp is not None:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+    return model
+
+# ====================== Pipeline ================================
+# Report sections in the order they appear in the output document.
+COMPARATORS = [
+    compare_moved_paragraphs,
+    compare_paragraphs,
+    compare_textboxes,
+    compare_headers_footers,
+    compare_tables,
+    compare_images,
+    compare_shapes,
+    compare_page_breaks,
+]
+
+def run_comparison(doc1, doc2, ndjson=None, keep=True, workers=1, progress=None):
+    """
+    Run every comparator on two documents (or DocumentModels) and return the ComparisonResult.
+    `ndjson` / `keep` are passed to ComparisonResult; save_report() or render_docx() turns it into the report.
+
+    With workers > 1 the comparators run concurrently in a thread pool (see iter_sections) and
+    their sections are merged in COMPARATORS order. progress(title, seconds, done, total) is
+    called as each section finishes.
+    """
+    result = ComparisonResult(ndjson=ndjson, keep=keep)
+    if workers == 1:
+        for done, compare in enumerate(COMPARATORS, start=1):
+            started = time.perf_counter()
+            compare(doc1, doc2, result)
+            if progress:
+                progress(result_title(result), time.perf_counter() - started, done, len(COMPARATORS))
+        return result
+
+    return merge_sections(iter_sections(doc1, doc2, workers), result, progress)
+
+def merge_sections(sections, result, progress=None):
+    """Collect (index, part, seconds) from `sections` and append the parts to `result` in COMPARATORS order."""
+    parts = [None] * len(COMPARATORS)
+    for done, (idx, part, seconds) in enumerate(sections, start=1):
+        parts[idx] = part
+        if progress:
+            progress(result_title(part), seconds, done, len(COMPARATORS))
+    for part in parts:
+        result.extend(part)
+    return result
+
+def run_comparison_processes(pre_source, post_source, workers=None, streaming=False, snapshot_pre=False,
+                             ndjson=None, keep=True, progress=None):
+    """
+    run_comparison() with every comparator in its own process. Each worker loads both documents
+    from the raw .docx bytes and sends its section back as plain records, so the slowest
+    comparator rather than the sum of all of them bounds the wall time. With snapshot_pre the
+    PRE snapshot is built (or read from the store) once here and handed to the workers.
+    """
+    def read(source):
+        if hasattr(source, "read"):
+            if hasattr(source, "seek"):
+                source.seek(0)
+            return source.read()
+        with open(source, "rb") as fh:
+            return fh.read()
+
+    pre_bytes, post_bytes = read(pre_source), read(post_source)
+    result = ComparisonResult(ndjson=ndjson, keep=keep)
+    return merge_sections(
+        iter_sections_in_processes(pre_bytes, post_bytes, workers, streaming, snapshot_pre), result, progress
+    )
 
-    if not found:
-        output_doc.add_paragraph("No moved paragraphs found ✅")
+def iter_sections_in_processes(pre_bytes, post_bytes, workers=None, streaming=False, snapshot_pre=False):
+    # the PRE side goes to the workers as raw bytes, or as an encoded snapshot built once in this
+    # process, so workers never extract it again or race each other writing the snapshot store
+    pre = _snapshot_encode(load_snapshot_model(BytesIO(pre_bytes), streaming), {}) if snapshot_pre else pre_bytes
+    # workers import this file as a module, also when it runs as the Streamlit script (__main__)
+    module = importlib.import_module(os.path.splitext(os.path.basename(__file__))[0])
+    # spawn: forking the multi-threaded Streamlit server is not safe
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers or len(COMPARATORS), mp_context=context) as pool:
+        futures = [
+            pool.submit(module.compare_section_job, (idx, pre, post_bytes, streaming, snapshot_pre))
+            for idx in range(len(COMPARATORS))
+        ]
+        for future in as_completed(futures):
+            idx, records, seconds = future.result()
+            part = ComparisonResult()
+            for rec in records:
+                part.add_record(rec)
+            yield idx, part, seconds
+
+def compare_section_job(job):
+    """Worker side of run_comparison_processes: one comparator -> (index, records, seconds)."""
+    idx, pre, post_bytes, streaming, snapshot_pre = job
+    started = time.perf_counter()
+    if snapshot_pre:
+        doc1 = _snapshot_decode(pre, [])
+    else:
+        doc1 = load_document_model(BytesIO(pre), streaming=streaming)
+    doc2 = load_document_model(BytesIO(post_bytes), streaming=streaming)
+    part = ComparisonResult()
+    COMPARATORS[idx](doc1, doc2, part)
+    return idx, part.records(), time.perf_counter() - started
+
+def iter_sections(doc1, doc2, workers=None):
+    """
+    Run each comparator into its own ComparisonResult on a thread pool, yielding
+    (index in COMPARATORS, result, seconds) in completion order. Comparators only read the
+    shared document models, which are built here first.
+    """
+    get_document_model(doc1), get_document_model(doc2)
+
+    def run_one(compare):
+        started = time.perf_counter()
+        part = ComparisonResult()
+        compare(doc1, doc2, part)
+        return part, time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=workers or len(COMPARATORS)) as pool:
+        futures = {pool.submit(run_one, compare): idx for idx, compare in enumerate(COMPARATORS)}
+        for future in as_completed(futures):
+            part, seconds = future.result()
+            yield futures[future], part, seconds
+
+def result_title(result):
+    """Title of the last section started in `result`."""
+    for item in reversed(result.items):
+        if isinstance(item, SectionMark):
+            return item.title
+    return result.section_key
+
+def render_docx(result):
+    """The classic .docx report: one Heading 1 per section, then each change's lines."""
+    output_doc = Document()
+    for item in result.items:
+        if isinstance(item, SectionMark):
+            output_doc.add_heading(item.title, level=1)
+        elif isinstance(item, Note):
+            output_doc.add_paragraph(item.text)
+        else:
+            for text, style, color in item.lines:
+                p = output_doc.add_paragraph(style=style)
+                run = p.add_run(_INVALID_XML_CHARS.sub("", text))  # lxml rejects control chars
+                if color:
+                    run.font.color.rgb = RGBColor(*color)
+    return output_doc
+
+# ---- fast report writer ----
+# save_report() writes the same report as render_docx(result).save(dest) without building
+# python-docx objects: the parts of python-docx's default template are copied into the new
+# package and word/document.xml is streamed from the report lines.
+REPORT_TEMPLATE = os.path.join(os.path.dirname(docx.__file__), "templates", "default.docx")
+REPORT_FLUSH_LINES = 2000
+_INVALID_XML_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]")
+_RUN_SPECIALS = re.compile(r"(\t|\n|\r)")
+
+def _xml_text(text):
+    text = _INVALID_XML_CHARS.sub("", text)
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+def _paragraph_xml(text, style=None, color=None):
+    # same markup python-docx produces: \t -> <w:tab/>, \n and \r -> <w:br/>
+    ppr = f'<w:pPr><w:pStyle w:val="{style.replace(" ", "")}"/></w:pPr>' if style else ""
+    rpr = '<w:rPr><w:color w:val="%02X%02X%02X"/></w:rPr>' % color if color else ""
+    parts = []
+    for piece in _RUN_SPECIALS.split(text):
+        if piece == "\t":
+            parts.append("<w:tab/>")
+        elif piece in ("\n", "\r"):
+            parts.append("<w:br/>")
+        elif piece:
+            space = ' xml:space="preserve"' if piece != piece.strip() else ""
+            parts.append(f'<w:t{space}>{_xml_text(piece)}</w:t>')
+    return f"<w:p>{ppr}<w:r>{rpr}{''.join(parts)}</w:r></w:p>"
+
+def _report_paragraphs(result):
+    for item in result.items:
+        if isinstance(item, SectionMark):
+            yield _paragraph_xml(item.title, "Heading 1")
+        elif isinstance(item, Note):
+            yield _paragraph_xml(item.text)
+        else:
+            for text, style, color in item.lines:
+                yield _paragraph_xml(text, style, color)
+
+def save_report(result, dest):
+    """Write the .docx report for `result` to `dest` (a path or a binary file object)."""
+    with zipfile.ZipFile(REPORT_TEMPLATE) as template, \
+            zipfile.ZipFile(dest, "w", zipfile.ZIP_DEFLATED) as out:
+        for info in template.infolist():
+            if info.filename != "word/document.xml":
+                out.writestr(info, template.read(info.filename))
+                continue
+            skeleton = template.read(info.filename).decode("utf-8")
+            body_start = skeleton.index("<w:body>") + len("<w:body>")
+            sect_start = skeleton.index("<w:sectPr")
+            with out.open("word/document.xml", "w") as fh:
+                fh.write(skeleton[:body_start].encode("utf-8"))
+                chunk = []
+                for para in _report_paragraphs(result):
+                    chunk.append(para)
+                    if len(chunk) >= REPORT_FLUSH_LINES:
+                        fh.write("".join(chunk).encode("utf-8"))
+                        chunk = []
+                fh.write("".join(chunk).encode("utf-8"))
+                fh.write(skeleton[sect_start:].encode("utf-8"))
+
+def write_ndjson(result, fh):
+    """Write the retained change records of `result` to a text stream, one JSON object per line."""
+    for change in result.changes:
+        fh.write(json.dumps(change_to_dict(change), ensure_ascii=False, default=str) + "\n")
+
+def report_filename(pre_name, post_name):
+    return f"Comparison_{pre_name}_vs_{post_name}.docx"
 
 # ====================== SREAMLIT UI ================================
 if __name__ == "__main__":
+    # imported here so headless users (batch_compare.py, worker processes) do not need Streamlit
+    import streamlit as st
+
     st.set_page_config(page_title="Word File Comparator", layout="centered")
     st.title("📄 Word Document Comparator")
     st.markdown("Upload your **Pre** and **Post** Word documents to compare changes like **text, formatting, spacing, fonts, images, tables, headers/footers, etc.**")
@@ -1695,30 +3400,52 @@ if __name__ == "__main__":
     st.subheader("📥 Upload Post Document (.docx)")
     uploaded_post = st.file_uploader("Upload the POST document", type=["docx"], key="post")
 
+    streaming = st.checkbox(
+        "Low-memory mode (streams the document XML; formatting checks are skipped)", value=False
+    )
+    use_processes = st.checkbox(
+        "Compare sections in separate processes (faster for very large documents on multi-core machines)",
+        value=False,
+    )
+    reuse_pre = st.checkbox(
+        "Reuse the saved snapshot of the Pre document (faster when comparing it against several Post versions)",
+        value=False,
+    )
+
     if uploaded_pre and uploaded_post:
         if st.button("🔍 Compare Documents"):
             with st.spinner("Comparing documents, please wait..."):
-                doc1 = Document(uploaded_pre)
-                doc2 = Document(uploaded_post)
-                output_doc = Document()
-
-                compare_moved_paragraphs(doc1, doc2, output_doc)
-                compare_paragraphs(doc1, doc2, output_doc)
-                compare_textboxes(doc1, doc2, output_doc)
-                compare_headers_footers(doc1, doc2, output_doc)
-                compare_tables(doc1, doc2, output_doc)
-                compare_images(doc1, doc2, output_doc)
-                compare_shapes(doc1, doc2, output_doc)
-                compare_page_breaks(doc1, doc2, output_doc)
-                
+                # sections run concurrently; each one is listed here as soon as it finishes
+                progress_bar = st.progress(0.0)
+                progress_log = st.empty()
+                finished = []
+
+                def show_progress(title, seconds, done, total):
+                    finished.append(f"- {title} ✅ ({seconds:.1f}s)")
+                    progress_bar.progress(done / total)
+                    progress_log.markdown("\n".join(finished))
+
+                if use_processes:
+                    # every worker process loads the documents itself
+                    result = run_comparison_processes(
+                        uploaded_pre, uploaded_post, streaming=streaming, snapshot_pre=reuse_pre,
+                        progress=show_progress,
+                    )
+                else:
+                    # one extraction pass per document, shared by every comparator
+                    doc1 = load_document_model(uploaded_pre, streaming=streaming, snapshot=reuse_pre)
+                    doc2 = load_document_model(uploaded_post, streaming=streaming)
+                    result = run_comparison(doc1, doc2, workers=len(COMPARATORS), progress=show_progress)
+                records = io.StringIO()
+                write_ndjson(result, records)
 
                 buffer = BytesIO()
-                output_doc.save(buffer)
+                save_report(result, buffer)
                 buffer.seek(0)
 
                 pre_name = uploaded_pre.name.rsplit('.', 1)[0]
                 post_name = uploaded_post.name.rsplit('.', 1)[0]
-                dynamic_filename = f"Comparison_{pre_name}_vs_{post_name}.docx"
+                dynamic_filename = report_filename(pre_name, post_name)
 
             st.success("✅ Comparison Complete!")
 
@@ -1738,6 +3465,12 @@ if __name__ == "__main__":
                 file_name=dynamic_filename,
                 mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
             )
+            st.download_button(
+                "⬇️ Download Change Records (NDJSON)",
+                data=records.getvalue().encode("utf-8"),
+                file_name=dynamic_filename.rsplit('.', 1)[0] + ".ndjson",
+                mime="application/x-ndjson"
+            )
     else:
         st.info("📌 Please upload both **Pre** and **Post** documents to begin comparison.")
 
@@ -0,0 +1,65 @@
+import random
+import time
+
+import comparison
+
+
+def full_cost(a, b, match_cost, rem_cost, add_cost):
+    n, m = len(a), len(b)
+    dp = [[0.0] * (m + 1) for _ in range(n + 1)]
+    for i in range(1, n + 1):
+        dp[i][0] = dp[i - 1][0] + rem_cost
+    for j in range(1, m + 1):
+        dp[0][j] = dp[0][j - 1] + add_cost
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            dp[i][j] = min(
+                dp[i - 1][j - 1] + match_cost(a[i - 1], b[j - 1]),
+                dp[i - 1][j] + rem_cost,
+                dp[i][j - 1] + add_cost,
+            )
+    return dp[n][m]
+
+
+def alignment_cost(actions, a, b, match_cost, gap):
+    return sum(match_cost(a[i], b[j]) if op == "MATCH" else gap for op, i, j in actions)
+
+
+def distance(x, y):
+    return abs(x - y)
+
+
+def test_alignment_is_optimal():
+    rnd = random.Random(3)
+    for _ in range(300):
+        a = [round(rnd.random() * 3, 2) for _ in range(rnd.randint(0, 40))]
+        b = list(a)
+        for _ in range(rnd.randint(0, 15)):
+            op = rnd.random()
+            if op < 0.3 and b:
+                b.pop(rnd.randrange(len(b)))
+            elif op < 0.6:
+                b.insert(rnd.randint(0, len(b)), round(rnd.random() * 3, 2))
+            elif b:
+                b[rnd.randrange(len(b))] += rnd.random()
+        actions = comparison.align_shapes(a, b, distance, 3.0, 3.0)
+        assert [i for _, i, _ in actions if i is not None] == list(range(len(a)))
+        assert [j for _, _, j in actions if j is not None] == list(range(len(b)))
+        assert abs(alignment_cost(actions, a, b, distance, 3.0) - full_cost(a, b, distance, 3.0, 3.0)) < 1e-6
+
+
+def test_banded_alignment_scales_with_the_band():
+    def seconds(n):
+        rnd = random.Random(n)
+        a = [rnd.random() for _ in range(n)]
+        b = a[:100] + a[110:n // 2] + [0.5] * 30 + a[n // 2:]
+        best = float("inf")
+        for _ in range(3):
+            started = time.perf_counter()
+            comparison.align_shapes(a, b, distance, 3.0, 3.0)
+            best = min(best, time.perf_counter() - started)
+        return best
+
+    small, large = seconds(4000), seconds(16000)
+    # fixed band width: 4x the shapes should cost ~4x, a full row per shape would cost ~16x
+    assert large < 8 * small
@@ -0,0 +1,64 @@
+import random
+
+import comparison
+
+LABELS = [
+    "Revenue", "Cost of sales", "Gross profit", "Operating expenses", "EBIT", "Tax", "Net income",
+    "Assets", "Liabilities", "Equity", "Cash", "Debt",
+]
+HEADER = ("Item", "Q1 2024", "Q2 2024", "Q3 2024", "Q4 2024")
+
+
+def report_tables(n, seed):
+    """n templated financial tables (same header and row labels) and an edited, shuffled copy of each."""
+    rnd = random.Random(seed)
+
+    def amount():
+        return f"{rnd.randint(0, 99999):,}"
+
+    old = [
+        (HEADER,) + tuple((label,) + tuple(amount() for _ in range(4)) for label in rnd.sample(LABELS, 8))
+        for _ in range(n)
+    ]
+    new = []
+    for rows in old:
+        p = rnd.uniform(0, 0.4)
+        new.append((rows[0],) + tuple(
+            (row[0],) + tuple(amount() if rnd.random() < p else cell for cell in row[1:]) for row in rows[1:]
+        ))
+    rnd.shuffle(new)
+    return old, new
+
+
+def inputs(tables):
+    sigs = ["||".join("|".join(row) for row in rows) for rows in tables]
+    dims = [(len(rows), len(rows[0])) for rows in tables]
+    return sigs, dims
+
+
+def test_blocking_keeps_candidates_well_below_all_pairs(monkeypatch):
+    monkeypatch.setattr(comparison, "TABLE_ALL_PAIRS_LIMIT", 0)
+    old, new = report_tables(600, seed=1)
+    (sig1, dim1), (sig2, dim2) = inputs(old), inputs(new)
+    candidates = comparison.table_match_candidates(old, new, sig1, sig2, dim1, dim2)
+    assert len(candidates) < 0.02 * len(old) * len(new)
+
+
+def test_blocking_finds_every_match_of_exhaustive_scoring(monkeypatch):
+    old, new = report_tables(150, seed=2)
+    (sig1, dim1), (sig2, dim2) = inputs(old), inputs(new)
+    every_pair = {(i, j) for i in range(len(old)) for j in range(len(new))}
+    expected = {(i, j) for _, i, j in comparison.score_table_candidates(sig1, sig2, dim1, dim2, every_pair, 0.65)}
+
+    monkeypatch.setattr(comparison, "TABLE_ALL_PAIRS_LIMIT", 0)
+    candidates = comparison.table_match_candidates(old, new, sig1, sig2, dim1, dim2)
+    assert expected <= candidates
+
+
+def test_columns_align_when_a_row_and_a_column_are_inserted_together():
+    old = [tuple(f"r{r}c{c}" for c in range(4)) for r in range(6)]
+    new = [row[:1] + (f"added {r}",) + row[1:] for r, row in enumerate(old)]
+    new.insert(0, ("a", "b", "c", "d", "e"))  # no shared header row to fall back on
+    assert comparison.align_table_columns(old, new) == [(0, 0), (1, 2), (2, 3), (3, 4)]
+    col_pairs = comparison.align_table_columns(old, new)
+    assert all(same for _, _, same in comparison.align_table_rows(old, new, col_pairs))